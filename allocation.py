@@ -0,0 +1,134 @@
+# ======================================================
+# EXPOSICIÓN POR CLASE Y SUBCLASE CONTRA OBJETIVO
+# ======================================================
+# Calcula la exposición real del portafolio en un mes, por clase y subclase,
+# en una moneda común: un solo SELECT agrupado (clase, subclase, moneda) y la
+# conversión vectorizada de fx. Luego la compara con `target_exposure` de
+# config.json y marca las desviaciones mayores a `risk_threshold`.
+#
+# Las llaves de target_exposure pueden ser nombres de subclase (p.ej.
+# "Acciones") o de clase (p.ej. "Inmuebles"); se busca primero la subclase.
+# La desviación se mide en porcentaje del objetivo: con risk_threshold = 30 un
+# objetivo de 20% se marca si la exposición real sale de 14%-26%.
+#
+# Los resultados se guardan en memoria por (portafolio, mes, moneda, versión
+# de datos, configuración): los tableros que consultan la API seguido no
+# vuelven a calcular mientras los datos no cambien.
+import json
+
+import pandas as pd
+
+import cache
+import fx
+import metrics
+
+CURRENCIES = ('USD', 'MXN')
+
+EXPOSURE_SQL = """
+    SELECT COALESCE(c.name, 'Sin clase')     AS class,
+           COALESCE(sc.name, 'Sin subclase') AS subclass,
+           av.month,
+           av.currency,
+           SUM(av.amount)                    AS amount
+      FROM asset_values av
+      JOIN assets a          ON a.id  = av.asset_id
+      LEFT JOIN classes c    ON c.id  = a.class_id
+      LEFT JOIN subclasses sc ON sc.id = a.subclass_id
+     WHERE a.portfolio_id = ?
+       AND av.month = ?
+     GROUP BY 1, 2, 3, 4
+"""
+
+_memo = cache.Memo(maxsize=256)
+
+
+def latest_month(conn, portfolio_id):
+    """Último mes con valores del portafolio (de la tabla de totales), o None."""
+    row = conn.execute("SELECT MAX(month) FROM portfolio_month_totals WHERE portfolio_id = ?",
+                       (portfolio_id,)).fetchone()
+    return row[0]
+
+
+def exposure(conn, portfolio_id, month, currency='USD', rates=None):
+    """
+    DataFrame (class, subclass, value) con el valor de cada subclase en
+    `currency` para el mes.
+    """
+    df = pd.read_sql_query(EXPOSURE_SQL, conn, params=(portfolio_id, month))
+    if rates is None:
+        rates = fx.rate_cache.snapshot()
+    with metrics.timer('pandas'):
+        df = fx.add_normalized_columns(df, rates)
+        df['value'] = df['usd_value' if currency == 'USD' else 'mxn_value']
+        return df.groupby(['class', 'subclass'], as_index=False)['value'].sum()
+
+
+def compare(by_subclass, targets, threshold):
+    """
+    Compara la exposición real (en % del total) con los objetivos. Devuelve una
+    lista de dicts: name, level ('subclass', 'class' o None si no existe),
+    target, actual, value, drift (puntos porcentuales), drift_pct (% del
+    objetivo) y flagged.
+    """
+    total = by_subclass['value'].sum()
+    share = by_subclass.assign(pct=by_subclass['value'] / total * 100 if total else 0.0)
+    sub_pct = share.groupby('subclass')[['pct', 'value']].sum()
+    class_pct = share.groupby('class')[['pct', 'value']].sum()
+
+    rows = []
+    for name, target in targets.items():
+        target = float(target)
+        if name in sub_pct.index:
+            level, actual, value = 'subclass', sub_pct.at[name, 'pct'], sub_pct.at[name, 'value']
+        elif name in class_pct.index:
+            level, actual, value = 'class', class_pct.at[name, 'pct'], class_pct.at[name, 'value']
+        else:
+            level, actual, value = None, 0.0, 0.0
+        drift = actual - target
+        drift_pct = drift / target * 100 if target else (float('inf') if actual else 0.0)
+        rows.append({
+            'name': name, 'level': level, 'target': target,
+            'actual': round(float(actual), 4), 'value': round(float(value), 2),
+            'drift': round(float(drift), 4),
+            'drift_pct': round(drift_pct, 2) if target else None,
+            'flagged': bool(abs(drift_pct) > threshold),
+        })
+    return rows
+
+
+def report(conn, portfolio_id, config, month=None, currency='USD'):
+    """
+    Exposición del mes (por defecto el último con datos) contra el objetivo de
+    `config`. Se calcula una vez por versión de datos y configuración.
+    """
+    if currency not in CURRENCIES:
+        raise ValueError(f"Moneda inválida: {currency!r}")
+    month = month or latest_month(conn, portfolio_id)
+    targets = config.get('target_exposure', {})
+    threshold = float(config.get('risk_threshold', 0))
+    key = (portfolio_id, month, currency, cache.data_version(conn, portfolio_id),
+           json.dumps([targets, threshold], sort_keys=True))
+    return _memo.get_or_compute(key, lambda: _build(conn, portfolio_id, month, currency,
+                                                    targets, threshold))
+
+
+def _build(conn, portfolio_id, month, currency, targets, threshold):
+    result = {'month': month, 'currency': currency, 'threshold': threshold,
+              'total': 0.0, 'by_class': [], 'by_subclass': [], 'targets': [], 'flagged': 0}
+    if month is None:
+        return result
+    by_subclass = exposure(conn, portfolio_id, month, currency)
+    total = float(by_subclass['value'].sum())
+    by_class = by_subclass.groupby('class', as_index=False)['value'].sum()
+    for df in (by_subclass, by_class):
+        df['pct'] = df['value'] / total * 100 if total else 0.0
+    result['total'] = round(total, 2)
+    result['by_class'] = by_class.round({'value': 2, 'pct': 4}).to_dict('records')
+    result['by_subclass'] = by_subclass.round({'value': 2, 'pct': 4}).to_dict('records')
+    result['targets'] = compare(by_subclass, targets, threshold)
+    result['flagged'] = sum(row['flagged'] for row in result['targets'])
+    return result
+
+
+def memo_stats():
+    return _memo.stats()
@@ -0,0 +1,176 @@
+# ======================================================
+# ANALÍTICA DE DESEMPEÑO (rendimientos, drawdown, volatilidad)
+# ======================================================
+# Construye en NumPy la matriz activos x meses del portafolio (en USD y en
+# MXN) con un solo query y calcula sobre la matriz completa, sin ciclos por
+# activo:
+#   - rendimiento mensual (cambio de valor contra el mes anterior con dato),
+#   - rendimiento acumulado y CAGR entre el primer y el último mes con dato,
+#   - máximo drawdown (caída máxima desde el máximo previo),
+#   - volatilidad móvil anualizada de los rendimientos (ventana de N meses).
+# El portafolio se trata como una fila más: la suma de los activos.
+#
+# Los rendimientos son cambios de valor: no descuentan aportaciones ni retiros.
+# Los resultados se guardan en memoria por (portafolio, ventana, versión de datos).
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import cache
+import fx
+import metrics
+
+VOLATILITY_WINDOW = 12
+
+VALUES_SQL = """
+    SELECT av.asset_id,
+           a.name AS asset_name,
+           av.month,
+           av.amount,
+           av.currency
+      FROM asset_values av
+      JOIN assets a ON a.id = av.asset_id
+     WHERE a.portfolio_id = ?
+"""
+
+_memo = cache.Memo(maxsize=64)
+
+
+def value_matrix(df, column):
+    """
+    Matriz (activos x meses) de `column` a partir de filas (asset_id, month);
+    NaN donde el activo no tiene valor. Devuelve (ids, meses, matriz).
+    """
+    asset_codes, asset_ids = pd.factorize(df['asset_id'], sort=True)
+    month_codes, months = pd.factorize(df['month'], sort=True)
+    matrix = np.full((len(asset_ids), len(months)), np.nan)
+    matrix[asset_codes, month_codes] = df[column].to_numpy(dtype=float)
+    return np.asarray(asset_ids), list(months), matrix
+
+
+def returns(matrix):
+    """Rendimiento de cada mes contra el mes anterior con dato (NaN si no hay)."""
+    prev = pd.DataFrame(matrix).ffill(axis=1).shift(1, axis=1).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = matrix / prev - 1
+    r[~np.isfinite(r) | np.isnan(matrix)] = np.nan
+    return r
+
+
+def _first_last(matrix):
+    """Índices de la primera y la última columna con dato por fila (-1 si no hay)."""
+    valid = ~np.isnan(matrix)
+    has = valid.any(axis=1)
+    first = np.where(has, valid.argmax(axis=1), -1)
+    last = np.where(has, matrix.shape[1] - 1 - valid[:, ::-1].argmax(axis=1), -1)
+    return first, last
+
+
+def summary_stats(matrix, months, window=VOLATILITY_WINDOW):
+    """
+    Métricas por fila de la matriz: dict de arreglos cumulative, cagr,
+    max_drawdown, volatility (última volatilidad móvil anualizada) y
+    last_return, más las series returns y rolling_volatility (filas x meses).
+    """
+    n_rows, n_months = matrix.shape
+    rows = np.arange(n_rows)
+    first, last = _first_last(matrix)
+    has = first >= 0
+    start = np.where(has, matrix[rows, np.maximum(first, 0)], np.nan)
+    end = np.where(has, matrix[rows, np.maximum(last, 0)], np.nan)
+
+    ordinal = np.array([int(m[:4]) * 12 + int(m[5:7]) for m in months])
+    periods = np.where(has, ordinal[np.maximum(last, 0)] - ordinal[np.maximum(first, 0)], 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = end / start
+        cumulative = growth - 1
+        cagr = np.where((periods > 0) & (growth > 0), growth ** (12 / np.maximum(periods, 1)) - 1, np.nan)
+        running_max = np.fmax.accumulate(np.where(matrix > 0, matrix, np.nan), axis=1)
+        drawdown = matrix / running_max - 1
+    cumulative[~np.isfinite(cumulative)] = np.nan
+
+    r = returns(matrix)
+    rolling = np.full_like(r, np.nan)
+    if n_months >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(r, window, axis=1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # ventanas sin datos suficientes
+            enough = np.sum(~np.isnan(windows), axis=-1) >= 2
+            vol = np.nanstd(windows, axis=-1, ddof=1) * np.sqrt(12)
+        rolling[:, window - 1:] = np.where(enough, vol, np.nan)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # filas sin ningún dato
+        max_drawdown = np.nanmin(drawdown, axis=1)
+    last_return = r[rows, np.maximum(last, 0)]
+    last_vol = rolling[rows, np.maximum(last, 0)]
+    return {
+        'cumulative': cumulative,
+        'cagr': cagr,
+        'max_drawdown': np.where(np.isfinite(max_drawdown), np.minimum(max_drawdown, 0), np.nan),
+        'volatility': np.where(has, last_vol, np.nan),
+        'last_return': np.where(has, last_return, np.nan),
+        'returns': r,
+        'rolling_volatility': rolling,
+    }
+
+
+def _clean(values, digits=6):
+    """Lista JSON: NaN/inf -> None."""
+    return [round(float(v), digits) if np.isfinite(v) else None for v in values]
+
+
+def build(conn, portfolio_id, window=VOLATILITY_WINDOW, rates=None):
+    """
+    Analítica completa del portafolio en USD y MXN, o None si no tiene valores.
+    Devuelve {'months', 'window', 'portfolio': {moneda: {...}}, 'assets': [...]}.
+    """
+    df = pd.read_sql_query(VALUES_SQL, conn, params=(portfolio_id,))
+    if df.empty:
+        return None
+    if rates is None:
+        rates = fx.rate_cache.snapshot()
+    with metrics.timer('pandas'):
+        df = fx.add_normalized_columns(df, rates)
+        names = df.drop_duplicates('asset_id').set_index('asset_id')['asset_name']
+        result = {'window': window, 'portfolio': {}, 'assets': []}
+        per_asset = {}
+        for currency, column in (('USD', 'usd_value'), ('MXN', 'mxn_value')):
+            ids, months, matrix = value_matrix(df, column)
+            totals = np.nansum(matrix, axis=0, where=~np.isnan(matrix))
+            totals[np.isnan(matrix).all(axis=0)] = np.nan
+            # El portafolio es una fila adicional al final de la matriz
+            stats = summary_stats(np.vstack([matrix, totals]), months, window)
+            result['months'] = months
+            result['portfolio'][currency] = {
+                'cumulative': _clean(stats['cumulative'][-1:])[0],
+                'cagr': _clean(stats['cagr'][-1:])[0],
+                'max_drawdown': _clean(stats['max_drawdown'][-1:])[0],
+                'volatility': _clean(stats['volatility'][-1:])[0],
+                'totals': _clean(totals, 2),
+                'returns': _clean(stats['returns'][-1]),
+                'rolling_volatility': _clean(stats['rolling_volatility'][-1]),
+            }
+            per_asset[currency] = {key: _clean(stats[key][:-1]) for key in
+                                   ('cumulative', 'cagr', 'max_drawdown', 'volatility', 'last_return')}
+    for i, asset_id in enumerate(ids):
+        result['assets'].append({
+            'id': int(asset_id),
+            'name': names[asset_id],
+            **{currency: {key: values[i] for key, values in stats.items()}
+               for currency, stats in per_asset.items()},
+        })
+    result['assets'].sort(key=lambda a: a['name'])
+    return result
+
+
+def report(conn, portfolio_id, window=VOLATILITY_WINDOW):
+    """build() memoizado por (portafolio, ventana, versión de datos)."""
+    key = (portfolio_id, window, cache.data_version(conn, portfolio_id))
+    return _memo.get_or_compute(key, lambda: build(conn, portfolio_id, window))
+
+
+def memo_stats():
+    return _memo.stats()
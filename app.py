@@ -1,22 +1,41 @@
 # ======================================================
 # IMPORTS: 
 # ======================================================
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Response, stream_with_context, get_flashed_messages, send_file
 import json
 import pandas as pd
 import plotly.express as px
+import database
 from database import get_db_connection
+import fx
+import blobstore
+import bulk_ops
+import import_assets
+import migrations
+import summary
+import history
+import export
+import allocation
+import analytics
+import charts
+import consolidated
+import cache
+import catalogs
+import metrics
+import logging
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 # Importar Flask-Login
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user, UserMixin
 import os
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, safe_join
 
 from flask import current_app
 
-# Carpeta donde escribir archivos subidos:
+# Carpeta de los adjuntos antiguos (dentro de static); los nuevos van al almacén
+# por contenido en ATTACHMENT_STORE y se sirven con /attachments/<id>
 UPLOAD_SUBFOLDER = 'uploads'
 ALLOWED_EXT = {'pdf', 'png', 'jpg', 'jpeg', 'gif'}
 
@@ -28,6 +47,32 @@ def allowed_file(filename):
 # ======================================================
 app = Flask(__name__)
 app.secret_key = "tu_clave_secreta"  # Necesaria para usar flash y sesiones
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', database.POOL_SIZE))
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '0') == '1'
+app.config['ATTACHMENT_STORE'] = os.environ.get(
+    'ATTACHMENT_STORE', os.path.join(app.root_path, 'attachment_store'))
+app.config['ATTACHMENT_MAX_BYTES'] = int(os.environ.get('ATTACHMENT_MAX_BYTES', blobstore.MAX_BYTES))
+# Werkzeug rechaza (413) antes de guardar el cuerpo cualquier petición mayor al
+# adjunto máximo más 1 MB para el resto del formulario
+app.config['MAX_CONTENT_LENGTH'] = app.config['ATTACHMENT_MAX_BYTES'] + 2**20
+# Hilos para calcular en paralelo los parciales de la vista consolidada (1 = un solo query)
+app.config['CONSOLIDATE_WORKERS'] = int(os.environ.get('CONSOLIDATE_WORKERS', 1))
+
+# Bitácora: LOG_LEVEL=DEBUG muestra el detalle de conversiones y de cada petición
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING').upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+database.init_app(app)  # Una conexión por petición, tomada de un pool
+cache.init_app(app)     # Caché de páginas por versión de datos
+metrics.init_app(app, gauges=lambda: {  # Server-Timing y /metrics (opcional)
+    'response_cache_bytes': cache.response_cache.bytes,
+    'response_cache_hits': cache.response_cache.hits,
+    'response_cache_misses': cache.response_cache.misses,
+    'rate_cache_hits': fx.rate_cache.hits,
+    'rate_cache_misses': fx.rate_cache.misses,
+    'db_pool_idle': database.get_pool().stats()['idle'],
+    'db_pool_created': database.get_pool().stats()['created'],
+})
 
 # ======================================================
 # CONFIGURACIÓN DE FLASK-LOGIN
@@ -56,6 +101,11 @@ def require_login():
     if request.endpoint not in ['login', 'static'] and not current_user.is_authenticated:
         return redirect(url_for('login'))
 
+# Aplica las migraciones de esquema pendientes (una vez por base y proceso)
+@app.before_request
+def ensure_schema():
+    migrations.ensure_current(get_db_connection(), database.db_path)
+
 # ======================================================
 # FILTRO PERSONALIZADO: Formatea números con comas y sin decimales.
 # ======================================================
@@ -66,6 +116,29 @@ def comma_filter(value):
     except (ValueError, TypeError):
         return value
 
+@app.template_filter('money')
+def money_filter(value):
+    """Monto con signo $, comas y sin decimales; vacío si no hay valor (None o NaN)."""
+    if value is None or value != value:
+        return ""
+    return "${:,.0f}".format(value)
+
+# ======================================================
+# RENDER EN STREAMING: envía la página por partes mientras se genera.
+# ======================================================
+def stream_page(template_name, **context):
+    """
+    Como render_template, pero la respuesta se envía a medida que Jinja la
+    genera (stream_with_context mantiene la petición viva durante el envío).
+    """
+    # Los mensajes flash se leen antes de responder: la cookie de sesión se
+    # guarda al iniciar el envío y no vería que ya se mostraron.
+    get_flashed_messages(with_categories=True)
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(16)
+    return Response(stream_with_context(stream))
+
 # ======================================================
 # FUNCIONES DE CONFIGURACIÓN: Cargar y guardar parámetros.
 # ======================================================
@@ -104,27 +177,22 @@ def portfolio_required(f):
 # ======================================================
 def get_exchange_rate(month):
     """
-    Obtiene el tipo de cambio (pesos por 1 dólar) para el mes dado desde la tabla exchange_rate.
-    Retorna 1 si no se encuentra.
+    Obtiene el tipo de cambio (pesos por 1 dólar) para el mes dado.
+    Se sirve desde la caché en memoria fx.rate_cache; retorna 1 si no se encuentra.
     """
-    month = month.strip()
-    conn = get_db_connection()
-    row = conn.execute('SELECT rate FROM exchange_rate WHERE month = ?', (month,)).fetchone()
-    conn.close()
-    rate = row['rate'] if row else 1
-    print(f"[DEBUG] Tipo de cambio para {month}: {rate}")
-    return rate
+    return fx.rate_cache.get(month)
 
 def normalize_to_mxn(row):
     """
     Convierte el monto a pesos (MXN).
     Si la moneda es USD, multiplica el monto por el tipo de cambio.
     Si la moneda es MXN, devuelve el monto sin cambios.
+    Para columnas completas usar fx.add_normalized_columns.
     """
     if row['currency'] == 'USD':
-        rate = get_exchange_rate(row['month'])
-        converted = row['amount'] * rate if rate and rate != 0 else row['amount']
-        print(f"[DEBUG] Convirtiendo: {row['amount']} USD * {rate} = {converted} MXN")
+        rate = get_exchange_rate(row['month']) or fx.DEFAULT_RATE
+        converted = float(fx.to_mxn(row['amount'], row['currency'], rate))
+        logger.debug("Convirtiendo: %s USD * %s = %s MXN", row['amount'], rate, converted)
         return converted
     else:
         return row['amount']
@@ -134,11 +202,12 @@ def normalize_to_usd(row):
     Convierte el monto a dólares (USD).
     Si la moneda es MXN, divide el monto por el tipo de cambio.
     Si la moneda es USD, devuelve el monto sin cambios.
+    Para columnas completas usar fx.add_normalized_columns.
     """
     if row['currency'] == 'MXN':
-        rate = get_exchange_rate(row['month'])
-        converted = row['amount'] / rate if rate and rate != 0 else row['amount']
-        print(f"[DEBUG] Convirtiendo: {row['amount']} MXN / {rate} = {converted} USD")
+        rate = get_exchange_rate(row['month']) or fx.DEFAULT_RATE
+        converted = float(fx.to_usd(row['amount'], row['currency'], rate))
+        logger.debug("Convirtiendo: %s MXN / %s = %s USD", row['amount'], rate, converted)
         return converted
     else:
         return row['amount']
@@ -218,6 +287,7 @@ def assets():
                 (asset_id, month, amount, currency, status_id)
             )
 
+            cache.bump_data_version(conn, portfolio_id)
             conn.commit()
             flash("Activo creado exitosamente.", "success")
         except Exception as e:
@@ -230,29 +300,28 @@ def assets():
 
     else:
         # GET: mostrar formulario. Necesitamos clases y estatus para los dropdowns
-        conn = get_db_connection()
-        classes  = conn.execute("SELECT * FROM classes").fetchall()
-        statuses = conn.execute("SELECT * FROM statuses").fetchall()
-        conn.close()
+        cat = catalogs.registry.get()
         return render_template('assets.html',
-                               classes=classes,
-                               statuses=statuses)
+                               classes=cat.classes,
+                               statuses=cat.statuses)
 
     
 # Listado de Activos por mes (con JOIN a asset_values)
-@app.route('/assets/list')
-@login_required
-@portfolio_required
-def assets_list():
-    # Mes a filtrar: por parámetro o default hoy
-    selected_month = request.args.get('month',
-                        datetime.now().strftime("%Y-%m"))
-    # Para marcar “mes actual” en la UI
-    current_month = datetime.now().strftime("%Y-%m")
+# Arriba de este número de filas el listado se pagina en el servidor
+# (ver assets_list_data) en lugar de enviar todas las filas en el HTML.
+ASSETS_LIST_SERVER_SIDE_THRESHOLD = 500
 
-    conn = get_db_connection()
-    # 1) Filtrar assets + valores dinámicos + catálogos
-    assets = conn.execute("""
+ASSETS_LIST_FROM = """
+        FROM asset_values av
+        JOIN assets a    ON av.asset_id    = a.id
+        LEFT JOIN classes    c  ON a.class_id    = c.id
+        LEFT JOIN subclasses sc ON a.subclass_id = sc.id
+        LEFT JOIN statuses    s  ON av.status_id = s.id
+        WHERE av.month = ?
+          AND a.portfolio_id = ?
+"""
+
+ASSETS_LIST_COLUMNS = """
         SELECT
           a.id,
           a.name             AS asset_name,
@@ -264,15 +333,32 @@ def assets_list():
           av.month           AS month,
           s.name             AS status_name,
           a.date_acquired    AS fecha_ingreso
-        FROM asset_values av
-        JOIN assets a    ON av.asset_id    = a.id
-        LEFT JOIN classes    c  ON a.class_id    = c.id
-        LEFT JOIN subclasses sc ON a.subclass_id = sc.id
-        LEFT JOIN statuses    s  ON av.status_id = s.id
-        WHERE av.month = ?
-          AND a.portfolio_id = ?
-        ORDER BY a.name
-    """, (selected_month, session['portfolio_id'])).fetchall()
+"""
+
+# Columnas de la tabla (en orden) -> expresión SQL para ordenar
+ASSETS_LIST_ORDER = ['a.id', 'a.name', 'a.location', 'av.amount', 'av.currency', 'av.month',
+                     'c.name', 'sc.name', 's.name', 'a.date_acquired']
+
+@app.route('/assets/list')
+@login_required
+@portfolio_required
+@cache.cached_view
+def assets_list():
+    # Mes a filtrar: por parámetro o default hoy
+    selected_month = request.args.get('month',
+                        datetime.now().strftime("%Y-%m"))
+    # Para marcar “mes actual” en la UI
+    current_month = datetime.now().strftime("%Y-%m")
+
+    conn = get_db_connection()
+    params = (selected_month, session['portfolio_id'])
+    total = conn.execute("SELECT COUNT(*) " + ASSETS_LIST_FROM, params).fetchone()[0]
+    server_side = total > ASSETS_LIST_SERVER_SIDE_THRESHOLD
+    # 1) Filtrar assets + valores dinámicos + catálogos (sólo si se pintan en el HTML)
+    assets = []
+    if not server_side:
+        assets = conn.execute(ASSETS_LIST_COLUMNS + ASSETS_LIST_FROM + " ORDER BY a.name",
+                              params).fetchall()
     # 2) Recoger meses disponibles para el filtro
     months = conn.execute("""
         SELECT DISTINCT month
@@ -286,37 +372,164 @@ def assets_list():
     return render_template(
         'assets_list.html',
         assets=assets,
+        total=total,
+        server_side=server_side,
         months=[m['month'] for m in months],
         selected_month=selected_month,
         current_month=current_month
     )
 
+# Datos del listado para DataTables en modo server-side: paginación, orden y
+# búsqueda se resuelven en SQL (LIMIT/OFFSET) y sólo viaja la página visible.
+@app.route('/api/assets/list')
+@login_required
+@portfolio_required
+def assets_list_data():
+    args = request.args
+    selected_month = args.get('month', datetime.now().strftime("%Y-%m"))
+    params = [selected_month, session['portfolio_id']]
+    try:
+        draw   = int(args.get('draw', 0))
+        start  = max(int(args.get('start', 0)), 0)
+        length = int(args.get('length', 10))
+        order_col = int(args.get('order[0][column]', 1))
+    except ValueError:
+        return jsonify({'error': 'Parámetros de paginación inválidos.'}), 400
+    if length < 0 or length > 1000:  # -1 = "todos" en DataTables; se acota
+        length = 1000
+    order_sql = ASSETS_LIST_ORDER[order_col] if 0 <= order_col < len(ASSETS_LIST_ORDER) else 'a.name'
+    order_dir = 'DESC' if args.get('order[0][dir]') == 'desc' else 'ASC'
+
+    conn = get_db_connection()
+    total = conn.execute("SELECT COUNT(*) " + ASSETS_LIST_FROM, params).fetchone()[0]
+
+    where = ""
+    search = args.get('search[value]', '').strip()
+    if search:
+        like = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where = """
+          AND (a.name LIKE ? ESCAPE '\\' OR a.location LIKE ? ESCAPE '\\'
+               OR c.name LIKE ? ESCAPE '\\' OR sc.name LIKE ? ESCAPE '\\'
+               OR s.name LIKE ? ESCAPE '\\' OR av.currency LIKE ? ESCAPE '\\')
+        """
+        params += [like] * 6
+        filtered = conn.execute("SELECT COUNT(*) " + ASSETS_LIST_FROM + where, params).fetchone()[0]
+    else:
+        filtered = total
+
+    rows = conn.execute(
+        ASSETS_LIST_COLUMNS + ASSETS_LIST_FROM + where +
+        f" ORDER BY {order_sql} {order_dir}, a.id LIMIT ? OFFSET ?",
+        params + [length, start]
+    ).fetchall()
+    conn.close()
+
+    return jsonify({
+        'draw': draw,
+        'recordsTotal': total,
+        'recordsFiltered': filtered,
+        'data': [dict(row) for row in rows],
+    })
+
 # Actualizar activos del mes actual.
 @app.route('/assets/update_current', methods=['GET', 'POST'])
 @login_required
 @portfolio_required
 def update_current():
-    current_month = datetime.now().strftime("%Y-%m")
+    """
+    Revaluación masiva del mes (por defecto el actual). Acepta los montos como
+    formulario (amount_<id> / currency_<id>), como arreglo JSON
+    [{asset_id|asset_name, amount, currency}] (o {"month", "values": [...]})
+    o como CSV (archivo `csv` o cuerpo text/csv). Las peticiones JSON/CSV
+    reciben el resultado en JSON, con los errores por fila.
+    """
+    pid = session['portfolio_id']
+    month = request.args.get('month') or datetime.now().strftime("%Y-%m")
     conn = get_db_connection()
+
     if request.method == 'POST':
-        assets = conn.execute("SELECT id FROM assets WHERE month = ? AND portfolio_id = ?", (current_month, session.get('portfolio_id'))).fetchall()
-        for asset in assets:
-            new_amount = request.form.get(f"amount_{asset['id']}")
-            if new_amount:
-                try:
-                    new_amount = float(new_amount)
-                    conn.execute("UPDATE assets SET asset_values = ? WHERE id = ?", (new_amount, asset['id']))
-                except ValueError:
-                    pass
-        conn.commit()
-        conn.close()
-        flash("Valores actualizados para el mes actual.", "success")
-        return redirect(url_for('assets_list'))
-    else:
-        assets = conn.execute("SELECT * FROM assets WHERE month = ? AND portfolio_id = ? AND (observaciones IS NULL OR observaciones = '')",
-                                (current_month, session.get('portfolio_id'))).fetchall()
+        wants_json = request.is_json or request.mimetype == 'text/csv'
+        try:
+            if request.is_json:
+                data = request.get_json(silent=True)
+                if data is None:
+                    raise ValueError("El cuerpo no es JSON válido.")
+                if isinstance(data, dict):
+                    month = data.get('month') or month
+                    if not isinstance(month, str):
+                        raise ValueError(f"Mes inválido: {month!r} (formato AAAA-MM)")
+                    data = data.get('values')
+                if not isinstance(data, list) or not all(isinstance(e, dict) for e in data):
+                    raise ValueError("Se esperaba un arreglo de objetos {asset_id, amount, currency}.")
+                entries = data
+            elif request.mimetype == 'text/csv':
+                entries = bulk_ops.read_value_rows(request.get_data(as_text=True))
+            elif request.files.get('csv') and request.files['csv'].filename:
+                entries = bulk_ops.read_value_rows(request.files['csv'].read().decode('utf-8-sig'))
+            else:
+                month = request.form.get('month') or month
+                entries = [{'asset_id': key[len('amount_'):], 'amount': value,
+                            'currency': request.form.get('currency_' + key[len('amount_'):])}
+                           for key, value in request.form.items()
+                           if key.startswith('amount_') and value.strip()]
+            status_ids = {st['name'].strip().lower(): st['id'] for st in catalogs.registry.get().statuses}
+            result = bulk_ops.revalue_month(conn, pid, month, entries, status_ids=status_ids)
+        except (ValueError, UnicodeDecodeError) as e:
+            conn.close()
+            if wants_json:
+                return jsonify({'error': str(e)}), 400
+            flash("No se pudo procesar la revaluación: " + str(e), "danger")
+            return redirect(url_for('update_current', month=month))
         conn.close()
-        return render_template('update_current.html', assets=assets, current_month=current_month)
+
+        if wants_json:
+            return jsonify(result), (200 if result['applied'] or not result['errors'] else 422)
+        flash(f"Revaluación {result['month']}: {result['applied']} valores actualizados, "
+              f"{result['unchanged']} sin cambio, {len(result['errors'])} con error.",
+              "success" if not result['errors'] else "warning")
+        for err in result['errors'][:20]:
+            flash(f"Fila {err['row']} ({err['asset']}): {err['error']}", "danger")
+        return redirect(url_for('update_current', month=result['month']))
+
+    rows = bulk_ops.month_values(conn, pid, month)
+    conn.close()
+    return render_template('update_current.html', assets=rows, current_month=month,
+                           currencies=bulk_ops.CURRENCIES)
+
+# Carga masiva de valores de un mes: CSV de la casa de bolsa o tabla pegada
+@app.route('/assets/upload_values', methods=['GET', 'POST'])
+@login_required
+@portfolio_required
+def upload_values():
+    pid = session['portfolio_id']
+    month = request.form.get('month') or datetime.now().strftime("%Y-%m")
+    result = None
+    if request.method == 'POST':
+        f = request.files.get('file')
+        text = f.read().decode('utf-8-sig', errors='replace') if f and f.filename else request.form.get('pasted', '')
+        conn = get_db_connection()
+        try:
+            entries = bulk_ops.read_value_rows(text)
+            lookups = import_assets.Lookups(conn, pid) if request.form.get('create_missing') else None
+            status_ids = {st['name'].strip().lower(): st['id'] for st in catalogs.registry.get().statuses}
+
+            def version_catalogs(conn):
+                # Catálogos creados al dar de alta activos: versión global en la misma transacción
+                if lookups and lookups_created_catalogs(lookups):
+                    cache.bump_data_version(conn)
+
+            result = bulk_ops.revalue_month(
+                conn, pid, month, entries, status_ids=status_ids,
+                create_asset=(lambda name: lookups.asset_id({'asset_name': name})) if lookups else None,
+                before_commit=version_catalogs)
+        except ValueError as e:
+            flash("No se pudo leer la carga: " + str(e), "danger")
+        else:
+            if lookups and lookups_created_catalogs(lookups):
+                catalogs.registry.invalidate()
+        finally:
+            conn.close()
+    return render_template('upload_values.html', month=month, result=result)
 
 # Edición de activo (státicos en assets, dinámicos en asset_values)
 @app.route('/assets/edit/<int:id>', methods=['GET', 'POST'])
@@ -333,58 +546,93 @@ def edit_asset(id):
         return redirect(url_for('assets_list'))
 
     if request.method == 'POST':
-        # —— 1) actualizar tabla assets ——
-        name           = request.form['asset_name']
-        location       = request.form['location']
-        date_acquired  = request.form['date_acquired']
-        class_id       = request.form['class_id']
-        subclass_id    = request.form['subclass_id']
-        observations   = request.form.get('observations', '')
-
-        conn.execute("""
-            UPDATE assets
-               SET name           = ?,
-                   location       = ?,
-                   date_acquired  = ?,
-                   class_id       = ?,
-                   subclass_id    = ?,
-                   observations   = ?
-             WHERE id = ?
-        """, (name, location, date_acquired, class_id, subclass_id, observations, id))
-
-        # —— 2) actualizar todos los meses en asset_values ——
-        months     = request.form.getlist('month')
-        amounts    = request.form.getlist('amount')
-        currencies = request.form.getlist('currency')
-        for m, amt, cur in zip(months, amounts, currencies):
-            try:
-                val = float(amt)
-            except:
-                val = 0.0
-            conn.execute("""
-                UPDATE asset_values
-                   SET amount   = ?,
-                       currency = ?
-                 WHERE asset_id= ? AND month = ?
-            """, (val, cur, id, m))
-
-        # —— 3) procesar adjunto nuevo (si hay) ——
+        # —— 1) datos del activo: sólo se actualizan si cambiaron ——
+        fields = {
+            'name':          request.form['asset_name'],
+            'location':      request.form['location'],
+            'date_acquired': request.form['date_acquired'],
+            'class_id':      request.form['class_id'],
+            'subclass_id':   request.form['subclass_id'],
+            'observations':  request.form.get('observations', ''),
+        }
+        changed_fields = [k for k, v in fields.items()
+                          if str(v) != str(asset_row[k] if asset_row[k] is not None else '')]
+
+        # —— 2) valores mensuales: se comparan contra lo guardado ——
+        stored = {r['month']: (r['amount'], r['currency']) for r in conn.execute(
+            "SELECT month, amount, currency FROM asset_values WHERE asset_id = ?", (id,))}
+        changes, errors = bulk_ops.diff_values(stored, zip(request.form.getlist('month'),
+                                                           request.form.getlist('amount'),
+                                                           request.form.getlist('currency')))
+        if errors:
+            conn.close()
+            flash("No se guardó ningún cambio. Valores inválidos: " + "; ".join(errors[:10])
+                  + (f" (y {len(errors) - 10} más)" if len(errors) > 10 else ""), "danger")
+            return redirect(url_for('edit_asset', id=id))
+
+        # —— 3) adjunto nuevo (si hay) ——
+        #      se guarda por contenido (blobstore): un archivo repetido no ocupa más espacio
+        attachment = None
         f = request.files.get('attachment')
         if f and allowed_file(f.filename):
-            fn = secure_filename(f.filename)
-            upload_dir = os.path.join(current_app.static_folder, UPLOAD_SUBFOLDER)
-            os.makedirs(upload_dir, exist_ok=True)
-            full_path = os.path.join(upload_dir, fn)
-            f.save(full_path)
-            rel_path  = f"{UPLOAD_SUBFOLDER}/{fn}"
-            conn.execute("""
-                INSERT INTO attachments (asset_id, filename, path)
-                     VALUES (?, ?, ?)
-            """, (id, fn, rel_path))
-
-        conn.commit()
+            store = app.config['ATTACHMENT_STORE']
+            try:
+                sha256, size, tmp_path = blobstore.save_stream(store, f.stream,
+                                                               app.config['ATTACHMENT_MAX_BYTES'])
+            except blobstore.TooLarge as e:
+                conn.close()
+                flash(f"No se guardó ningún cambio. {e}", "danger")
+                return redirect(url_for('edit_asset', id=id))
+            attachment = {'filename': secure_filename(f.filename) or 'adjunto', 'sha256': sha256,
+                          'size': size, 'mimetype': f.mimetype, 'tmp_path': tmp_path}
+
+        if not (changed_fields or changes or attachment):
+            conn.close()
+            flash("Sin cambios: no se modificó nada.", "info")
+            return redirect(url_for('assets_list'))
+
+        # —— 4) todo en una sola transacción (con el candado de escritura desde el inicio) ——
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if changed_fields:
+                conn.execute(
+                    "UPDATE assets SET " + ", ".join(f"{k} = ?" for k in changed_fields) + " WHERE id = ?",
+                    [fields[k] for k in changed_fields] + [id])
+            bulk_ops.apply_value_changes(conn, id, changes)
+            if attachment:
+                attachment['is_new'] = blobstore.register(
+                    conn, app.config['ATTACHMENT_STORE'], attachment['sha256'], attachment['size'],
+                    attachment['tmp_path'], attachment['mimetype'])
+                conn.execute("""
+                    INSERT INTO attachments (asset_id, filename, path, sha256)
+                         VALUES (?, ?, ?, ?)
+                """, (id, attachment['filename'],
+                      blobstore.relative_path(attachment['sha256']), attachment['sha256']))
+            cache.bump_data_version(conn, asset_row['portfolio_id'])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if attachment:
+                blobstore.discard(conn, app.config['ATTACHMENT_STORE'], attachment['sha256'],
+                                  attachment['tmp_path'])
+            raise
         conn.close()
-        flash("Activo y valores actualizados correctamente.", "success")
+
+        summary_parts = []
+        if changed_fields:
+            summary_parts.append("datos del activo (" + ", ".join(changed_fields) + ")")
+        if changes:
+            detail = ", ".join(
+                f"{c['month']}: {c['old_amount']:,.2f} {c['old_currency'] or ''} → {c['amount']:,.2f} {c['currency']}"
+                if c['amount'] is not None and c['old_amount'] is not None
+                else f"{c['month']}: {c['currency']}"
+                for c in changes[:10])
+            more = f" y {len(changes) - 10} más" if len(changes) > 10 else ""
+            summary_parts.append(f"{len(changes)} mes(es): {detail}{more}")
+        if attachment:
+            summary_parts.append(f"adjunto {attachment['filename']}"
+                                 + ("" if attachment['is_new'] else " (contenido ya guardado, no se duplicó)"))
+        flash("Activo actualizado — " + "; ".join(summary_parts) + ".", "success")
         return redirect(url_for('assets_list'))
 
     else:
@@ -401,33 +649,72 @@ def edit_asset(id):
 
         # —— adjuntos existentes ——
         attachments = conn.execute("""
-            SELECT filename, path
+            SELECT id, filename, path, sha256
               FROM attachments
              WHERE asset_id = ?
         """, (id,)).fetchall()
 
-        # —— catálogos ——
-        classes    = conn.execute("SELECT * FROM classes").fetchall()
-        subclasses = conn.execute("SELECT * FROM subclasses WHERE class_id = ?",
-                                  (asset['class_id'],)).fetchall()
-        statuses   = conn.execute("SELECT * FROM statuses").fetchall()
-
         conn.close()
+
+        # —— catálogos ——
+        cat = catalogs.registry.get()
         return render_template('edit_asset.html',
                                asset=asset,
                                values=values,
                                attachments=attachments,
-                               classes=classes,
-                               subclasses=subclasses,
-                               statuses=statuses)
+                               classes=cat.classes,
+                               subclasses=cat.subclasses_of(asset['class_id']),
+                               statuses=cat.statuses)
         
+# Descarga de adjuntos: send_file con ETag, 304 y Range (PDFs grandes por partes)
+@app.route('/attachments/<int:attachment_id>')
+@login_required
+def download_attachment(attachment_id):
+    conn = get_db_connection()
+    row = conn.execute("""
+        SELECT a.filename, a.path, a.sha256, b.mimetype
+          FROM attachments a
+          LEFT JOIN blobs b ON b.sha256 = a.sha256
+         WHERE a.id = ?
+    """, (attachment_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return "Adjunto no encontrado", 404
+    if row['sha256']:
+        path = blobstore.blob_path(app.config['ATTACHMENT_STORE'], row['sha256'])
+        etag = row['sha256']
+    else:
+        # Adjunto anterior al almacén por contenido: sigue en static/uploads
+        path = safe_join(current_app.static_folder, row['path'])
+        etag = True
+    if path is None or not os.path.isfile(path):
+        return "Archivo no encontrado", 404
+    resp = send_file(path, mimetype=row['mimetype'], download_name=row['filename'],
+                     as_attachment=request.args.get('download') == '1',
+                     conditional=True, etag=etag, max_age=86400)
+    # El contenido de un adjunto nunca cambia, pero es privado del usuario
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    return resp
+
+@app.errorhandler(413)
+def request_too_large(e):
+    flash(f"El archivo es demasiado grande (máximo {app.config['ATTACHMENT_MAX_BYTES']:,} bytes). "
+          "No se guardó ningún cambio.", "danger")
+    return redirect(request.referrer or url_for('assets_list'))
+
 # Eliminación de activo (con confirmación)
 @app.route('/assets/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_asset(id):
     conn = get_db_connection()
+    row = conn.execute('SELECT portfolio_id FROM assets WHERE id = ?', (id,)).fetchone()
     conn.execute('DELETE FROM assets WHERE id = ?', (id,))
+    if row:
+        cache.bump_data_version(conn, row['portfolio_id'])
     conn.commit()
+    # Los adjuntos se borran en cascada; los archivos que ya nadie usa, aquí
+    blobstore.collect_garbage(conn, app.config['ATTACHMENT_STORE'])
     conn.close()
     flash("Activo eliminado definitivamente.", "danger")
     return redirect(url_for('assets_list'))
@@ -446,25 +733,12 @@ def copy_assets():
 
     if request.method == 'POST':
         dest = request.form['new_month'].strip()
-        selected = request.form.getlist('asset_ids')
-        for aid in selected:
-            row = conn.execute("""
-                SELECT amount, currency, status_id
-                  FROM asset_values
-                 WHERE asset_id = ? AND month = ?
-            """, (aid, src)).fetchone()
-            if row:
-                conn.execute("""
-                    INSERT OR IGNORE INTO asset_values
-                        (asset_id, month, amount, currency, status_id)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (aid, dest,
-                      row['amount'],
-                      row['currency'],
-                      row['status_id']))
-        conn.commit()
+        # Sin selección explícita y con "copiar todo" se copia el portafolio completo
+        selected = None if request.form.get('copy_all') else request.form.getlist('asset_ids')
+        result = bulk_ops.copy_month(conn, src, dest, pid, selected)
         conn.close()
-        flash(f"Activos copiados de {src} a {dest}.", "success")
+        flash(f"Activos copiados de {src} a {dest}: {result['inserted']} nuevos, "
+              f"{result['skipped']} ya existían.", "success")
         return redirect(url_for('assets_list'))
 
     # GET: listar para el mes src
@@ -498,111 +772,48 @@ def copy_assets():
 # HISTÓRICO DE ACTIVOS: Tabla pivote con valores normalizados a USD (principal) y totales/variaciones en USD y MXN.
 @app.route('/assets/history_view')
 @login_required
+@cache.cached_view
 def assets_history_view():
-    # 1) Abrir conexión
-    conn = get_db_connection()
-
-    # 2) Traer histórico de valores
-    sql = """
-    SELECT
-      a.id,
-      a.name       AS asset_name,
-      av.month     AS month,
-      av.amount    AS amount,
-      av.currency  AS currency
-    FROM assets a
-    JOIN asset_values av
-      ON a.id = av.asset_id
-    WHERE a.portfolio_id = ?
-    ORDER BY av.month, a.name
-    """
-    df = pd.read_sql_query(sql, conn, params=(session.get('portfolio_id'),))
-    conn.close()
-
-    # 3) Si no hay datos
-    if df.empty:
-        table_html = "<p>No hay datos históricos para mostrar.</p>"
-    else:
-        # 4) Convertir amount y calcular valores USD/MXN
-        df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
-        df['usd_value'] = df.apply(lambda row: row['amount'] if row['currency'] == 'USD'
-                                    else row['amount'] / get_exchange_rate(row['month']), axis=1)
-        df['mxn_value'] = df.apply(lambda row: row['amount'] if row['currency'] == 'MXN'
-                                    else row['amount'] * get_exchange_rate(row['month']), axis=1)
-
-        # 5) Preparar estructuras
-        months = sorted(df['month'].unique())
-        exchange_rates = {m: get_exchange_rate(m) for m in months}
-        totals_usd = {m: df[df['month'] == m]['usd_value'].sum() for m in months}
-        totals_mxn = {m: df[df['month'] == m]['mxn_value'].sum() for m in months}
-
-        # 6) Calcular variaciones porcentuales
-        variation_usd_pct = {}
-        variation_mxn_pct = {}
-        for i, m in enumerate(months):
-            if i == 0:
-                variation_usd_pct[m] = None
-                variation_mxn_pct[m] = None
-            else:
-                prev = months[i-1]
-                # evitar división por cero
-                variation_usd_pct[m] = ((totals_usd[m] - totals_usd[prev]) / totals_usd[prev] * 100
-                                        if totals_usd[prev] else 0)
-                variation_mxn_pct[m] = ((totals_mxn[m] - totals_mxn[prev]) / totals_mxn[prev] * 100
-                                        if totals_mxn[prev] else 0)
-
-        # 7) Pivot y armado de tabla HTML
-        pivot = df.pivot_table(index='asset_name', columns='month',
-                               values='usd_value', aggfunc='sum').fillna("")
-
-        html = "<table class='table table-bordered'>"
-        # Header
-        html += "<tr><th>Activo</th>" + "".join(f"<th>{m}</th>" for m in months) + "</tr>"
-        # Tipo de cambio
-        html += "<tr><th>TC</th>" + "".join(f"<th>{exchange_rates[m]:.2f}</th>" for m in months) + "</tr>"
-        # Filas por activo
-        for asset in pivot.index:
-            html += "<tr><td>{}</td>{}</tr>".format(
-                asset,
-                "".join(
-                    f"<td>${pivot.loc[asset, m]:,.0f}</td>"
-                    if pivot.loc[asset, m] != "" else "<td></td>"
-                    for m in months
-                )
-            )
-        # Totales USD
-        html += "<tr><td><strong>Total USD</strong></td>" + \
-                "".join(f"<td><strong>${totals_usd[m]:,.0f}</strong></td>" for m in months) + \
-                "</tr>"
-        # Totales MXN
-        html += "<tr><td><strong>Total MXN</strong></td>" + \
-                "".join(f"<td><strong>${totals_mxn[m]:,.0f}</strong></td>" for m in months) + \
-                "</tr>"
-        # Variación (%) USD
-        html += "<tr><td><strong>Var. % USD</strong></td>"
-        for m in months:
-            pct = variation_usd_pct[m]
-            if pct is None:
-                html += "<td></td>"
-            else:
-                color = "green" if pct >= 0 else "red"
-                html += f"<td><span style='color:{color}'> {pct:+.0f}%</span></td>"
-        html += "</tr>"
-        # Variación (%) MXN
-        html += "<tr><td><strong>Var. % MXN</strong></td>"
-        for m in months:
-            pct = variation_mxn_pct[m]
-            if pct is None:
-                html += "<td></td>"
-            else:
-                color = "green" if pct >= 0 else "red"
-                html += f"<td><span style='color:{color}'> {pct:+.0f}%</span></td>"
-        html += "</tr>"
+    portfolio_id = session.get('portfolio_id')
+    # Los datos (ver history.build) se calculan cuando la plantilla llega a la
+    # tabla: el encabezado de la página ya salió hacia el navegador.
+    return stream_page('assets_history.html',
+                       load_history=lambda: history.build(get_db_connection(), portfolio_id))
 
-        html += "</table>"
-        table_html = html
+# Exportación del histórico como tabla plana (CSV en streaming, Parquet o Arrow)
+@app.route('/assets/export')
+@login_required
+@portfolio_required
+def export_history():
+    pid = session['portfolio_id']
+    fmt = request.args.get('format', 'csv')
+    normalized = request.args.get('normalized') == '1'
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    try:
+        export.check_format(fmt)
+    except (ValueError, RuntimeError) as e:
+        flash(str(e), "warning")
+        return redirect(url_for('assets_history_view'))
+    mimetype, ext = export.FORMATS[fmt]
+    filename = f"historico_{pid}_{datetime.now():%Y%m%d}.{ext}"
+
+    if fmt == 'parquet':
+        frames = export.iter_frames(get_db_connection(), pid, start, end, normalized)
+        return send_file(export.parquet_file(frames, normalized), mimetype=mimetype,
+                         as_attachment=True, download_name=filename)
+
+    def generate():
+        # La conexión se toma dentro del generador: la del envío, no la de la vista
+        frames = export.iter_frames(get_db_connection(), pid, start, end, normalized)
+        if fmt == 'csv':
+            for text in export.csv_chunks(frames, normalized):
+                yield text.encode('utf-8')
+        else:
+            yield from export.arrow_chunks(frames, normalized)
 
-    return render_template('assets_history.html', table_html=table_html)
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 # Tipo de Cambio Global: Permite actualizar el tipo de cambio para un mes.
 @app.route('/exchange_rate', methods=['GET', 'POST'])
@@ -617,15 +828,186 @@ def exchange_rate():
             rate = 1
         conn = get_db_connection()
         existing = conn.execute('SELECT * FROM exchange_rate WHERE month = ?', (month,)).fetchone()
-        if existing:
-            conn.execute('UPDATE exchange_rate SET rate = ? WHERE month = ?', (rate, month))
-        else:
-            conn.execute('INSERT INTO exchange_rate (month, rate) VALUES (?, ?)', (month, rate))
-        conn.commit()
-        conn.close()
+        try:
+            if existing:
+                conn.execute('UPDATE exchange_rate SET rate = ? WHERE month = ?', (rate, month))
+            else:
+                conn.execute('INSERT INTO exchange_rate (month, rate) VALUES (?, ?)', (month, rate))
+            cache.bump_data_version(conn)
+            fx.rate_cache.set(month, rate)
+            conn.commit()
+            # Una recarga de la serie entre set() y el commit leyó la tasa
+            # anterior; se descarta para que la versión nueva use la nueva.
+            fx.rate_cache.expire_snapshot()
+        except Exception:
+            conn.rollback()
+            fx.rate_cache.invalidate()
+            raise
+        finally:
+            conn.close()
         return redirect(url_for('exchange_rate'))
     return render_template('exchange_rate.html')
 
+# EXPOSICIÓN CONTRA OBJETIVO: página y API (ver allocation.py)
+def allocation_report():
+    """Reporte para el portafolio en sesión con los parámetros month y currency."""
+    conn = get_db_connection()
+    try:
+        return allocation.report(conn, session['portfolio_id'], load_config(),
+                                 month=request.args.get('month') or None,
+                                 currency=request.args.get('currency', 'USD').upper())
+    finally:
+        conn.close()
+
+@app.route('/allocation')
+@login_required
+@portfolio_required
+def allocation_view():
+    try:
+        result = allocation_report()
+    except ValueError as e:
+        flash(str(e), "warning")
+        return redirect(url_for('allocation_view'))
+    return render_template('allocation.html', result=result, currencies=allocation.CURRENCIES)
+
+@app.route('/api/allocation')
+@login_required
+@portfolio_required
+def api_allocation():
+    try:
+        return jsonify(allocation_report())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# DESEMPEÑO: rendimientos, drawdown y volatilidad (ver analytics.py)
+def analytics_report():
+    """Analítica del portafolio en sesión; parámetro opcional window (meses)."""
+    window = request.args.get('window', analytics.VOLATILITY_WINDOW)
+    try:
+        window = int(window)
+    except (TypeError, ValueError):
+        raise ValueError(f"Ventana inválida: {window!r}")
+    if not 2 <= window <= 120:
+        raise ValueError("La ventana de volatilidad debe estar entre 2 y 120 meses.")
+    conn = get_db_connection()
+    try:
+        return analytics.report(conn, session['portfolio_id'], window)
+    finally:
+        conn.close()
+
+@app.route('/analytics')
+@login_required
+@portfolio_required
+def analytics_view():
+    try:
+        result = analytics_report()
+    except ValueError as e:
+        flash(str(e), "warning")
+        return redirect(url_for('analytics_view'))
+    currency = request.args.get('currency', 'USD').upper()
+    if currency not in allocation.CURRENCIES:
+        currency = 'USD'
+    return render_template('analytics.html', result=result, currency=currency,
+                           currencies=allocation.CURRENCIES)
+
+@app.route('/api/analytics')
+@login_required
+@portfolio_required
+def api_analytics():
+    try:
+        return jsonify(analytics_report())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# VISTA CONSOLIDADA DE VARIOS PORTAFOLIOS (ver consolidated.py)
+# Parámetros: portfolios (varios, o lista separada por comas; por defecto todos),
+# currency, start / end (YYYY-MM).
+def consolidated_report():
+    names = catalogs.portfolio_names.all()
+    raw = ",".join(request.args.getlist('portfolios'))
+    try:
+        selected = sorted({int(p) for p in raw.split(',') if p.strip()}) or sorted(names)
+    except ValueError:
+        raise ValueError("portfolios debe ser una lista de IDs numéricos")
+    unknown = [pid for pid in selected if pid not in names]
+    if unknown:
+        raise ValueError("Portafolio(s) inexistente(s): " + ", ".join(map(str, unknown)))
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    for month in (start, end):
+        if month is not None and not bulk_ops.MONTH_RE.match(month):
+            raise ValueError(f"Mes inválido: {month!r} (use YYYY-MM)")
+    conn = get_db_connection()
+    try:
+        result = consolidated.report(conn, selected, request.args.get('currency', 'USD').upper(),
+                                     start, end, workers=app.config['CONSOLIDATE_WORKERS'])
+    finally:
+        conn.close()
+    result.update(portfolios=selected, start=start, end=end,
+                  names={pid: names[pid] for pid in selected})
+    return result
+
+@app.route('/consolidated')
+@login_required
+def consolidated_view():
+    try:
+        result = consolidated_report()
+    except ValueError as e:
+        flash(str(e), "warning")
+        return redirect(url_for('consolidated_view'))
+    return render_template('consolidated.html', result=result,
+                           all_portfolios=catalogs.portfolio_names.all(),
+                           currencies=consolidated.CURRENCIES)
+
+@app.route('/api/consolidated')
+@login_required
+def api_consolidated():
+    try:
+        return jsonify(consolidated_report())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# SERIES POR ACTIVO PARA GRÁFICAS (ver charts.py)
+# Parámetros opcionales: start / end (YYYY-MM) y points (máximo de puntos por serie).
+def series_response(asset_ids):
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    for month in (start, end):
+        if month is not None and not bulk_ops.MONTH_RE.match(month):
+            return jsonify({'error': f"Mes inválido: {month!r} (use YYYY-MM)"}), 400
+    points = request.args.get('points') or None
+    if points is not None:
+        if not points.isdigit() or int(points) < 3:
+            return jsonify({'error': "points debe ser un entero mayor o igual a 3"}), 400
+        points = int(points)
+    if not asset_ids or len(asset_ids) > charts.MAX_ASSETS:
+        return jsonify({'error': f"Indique entre 1 y {charts.MAX_ASSETS} activos"}), 400
+    conn = get_db_connection()
+    try:
+        series = charts.asset_series(conn, session['portfolio_id'], asset_ids, start, end, points)
+    finally:
+        conn.close()
+    return jsonify({'start': start, 'end': end, 'points': points, 'assets': series})
+
+@app.route('/api/assets/<int:id>/series')
+@login_required
+@portfolio_required
+@cache.cached_view
+def api_asset_series(id):
+    return series_response([id])
+
+@app.route('/api/assets/series')
+@login_required
+@portfolio_required
+@cache.cached_view
+def api_assets_series():
+    """Varios activos: ids=1,2,3"""
+    try:
+        ids = sorted({int(i) for i in request.args.get('ids', '').split(',') if i.strip()})
+    except ValueError:
+        return jsonify({'error': "ids debe ser una lista de enteros separada por comas"}), 400
+    return series_response(ids)
+
 # Help Page
 @app.route('/help')
 @login_required
@@ -651,8 +1033,9 @@ def create_portfolio():
         if name:
             conn = get_db_connection()
             try:
-                conn.execute('INSERT INTO portfolios (name) VALUES (?)', (name,))
+                cursor = conn.execute('INSERT INTO portfolios (name) VALUES (?)', (name,))
                 conn.commit()
+                catalogs.portfolio_names.set(cursor.lastrowid, name)
                 flash("Portafolio creado exitosamente.", "success")
             except Exception as e:
                 flash("Error al crear el portafolio: " + str(e), "danger")
@@ -666,7 +1049,13 @@ def create_portfolio():
 @app.route('/portfolios/select/<int:portfolio_id>')
 @login_required
 def select_portfolio(portfolio_id):
+    name = catalogs.portfolio_names.get(portfolio_id)
+    if name is None:
+        flash("El portafolio no existe.", "danger")
+        return redirect(url_for('portfolios'))
     session['portfolio_id'] = portfolio_id
+    # El nombre viaja en la sesión: la plantilla base no consulta la base de datos
+    session['portfolio_name'] = name
     flash("Portafolio seleccionado.", "success")
     return redirect(url_for('assets_list'))
 
@@ -676,54 +1065,62 @@ def select_portfolio(portfolio_id):
 @app.context_processor
 def inject_portfolio():
     portfolio_id = session.get('portfolio_id')
-    name = "Default"
-    conn = get_db_connection()
-    row = conn.execute('SELECT name FROM portfolios WHERE id = ?', (portfolio_id,)).fetchone()
-    conn.close()
-    if row is not None:
-        name = row['name']
+    if portfolio_id is None:
+        return {'current_portfolio_name': "Default"}
+    name = session.get('portfolio_name')
+    if name is None:
+        # Sesiones anteriores a guardar el nombre: se toma de la caché en memoria
+        name = catalogs.portfolio_names.get(portfolio_id, "Default")
     return {'current_portfolio_name': name}
 
 import json
 from flask import jsonify
 
+def catalog_json(data, etag):
+    """Respuesta JSON de catálogo con ETag; 304 si el navegador ya la tiene."""
+    resp = jsonify(data)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp.make_conditional(request)
+
 # Endpoint para obtener las clases (Tipos de Activo)
 @app.route('/api/classes')
 def api_classes():
-    conn = get_db_connection()
-    classes = conn.execute("SELECT * FROM classes").fetchall()
-    conn.close()
-    # Convertir los resultados a lista de diccionarios
-    classes_list = [dict(row) for row in classes]
-    return jsonify(classes_list)
+    cat = catalogs.registry.get()
+    return catalog_json(cat.classes, cat.etag('classes'))
 
 # Endpoint para obtener las subclases según una clase dada
 @app.route('/api/subclasses/<int:class_id>')
 def api_subclasses(class_id):
-    conn = get_db_connection()
-    subclasses = conn.execute("SELECT * FROM subclasses WHERE class_id = ?", (class_id,)).fetchall()
-    conn.close()
-    subclasses_list = [dict(row) for row in subclasses]
-    return jsonify(subclasses_list)
+    cat = catalogs.registry.get()
+    return catalog_json(cat.subclasses_of(class_id), cat.etag('subclasses', class_id))
 
 # ==================================================================
 # ENDPOINTS PARA CONFIGURACIÓN DE CATÁLOGOS
 # ==================================================================
 
+# Tras crear, editar o borrar clases, subclases o estatus: confirma el cambio
+# junto con la nueva versión global (invalida las páginas en caché) y recarga
+# el registro en memoria.
+def catalogs_changed(conn):
+    cache.bump_data_version(conn)
+    conn.commit()
+    catalogs.registry.invalidate()
+
+def lookups_created_catalogs(lookups):
+    """True si una carga con import_assets.Lookups dio de alta clases, subclases o estatus."""
+    return any(lookups.created[k] for k in ('classes', 'subclasses', 'statuses'))
+
 # Página principal del módulo de configuración de catálogos
 @app.route('/config/catalogs')
 @login_required
 def config_catalogs():
-    conn       = get_db_connection()
-    classes    = conn.execute("SELECT * FROM classes").fetchall()
-    subclasses = conn.execute("SELECT * FROM subclasses").fetchall()
-    statuses   = conn.execute("SELECT * FROM statuses").fetchall()
-    conn.close()
+    cat = catalogs.registry.get()
     return render_template(
         'config_catalogs.html',
-        classes    = classes,
-        subclasses = subclasses,
-        statuses   = statuses
+        classes    = cat.classes,
+        subclasses = cat.subclasses,
+        statuses   = cat.statuses
     )
 
 # Configuración de Clases
@@ -735,17 +1132,15 @@ def config_clases():
         name = request.form.get('name')
         if name:
             conn.execute("INSERT INTO classes (name) VALUES (?)", (name,))
-            conn.commit()
+            catalogs_changed(conn)
             flash("Clase creada exitosamente.", "success")
         else:
             flash("El nombre de la clase es obligatorio.", "warning")
         conn.close()
         return redirect(url_for('config_clases'))
     else:
-        classes = conn.execute("SELECT * FROM classes").fetchall()
-        subclasses = conn.execute("SELECT * FROM subclasses").fetchall()
         conn.close()
-        return render_template('config_clases.html', classes=classes)
+        return render_template('config_clases.html', classes=catalogs.registry.get().classes)
 
 # Editar una clase
 @app.route('/config/clases/edit/<int:class_id>', methods=['GET', 'POST'])
@@ -764,7 +1159,7 @@ def edit_clase(class_id):
             flash("El nombre no puede estar vacío.", "warning")
         else:
             conn.execute("UPDATE classes SET name = ? WHERE id = ?", (new_name, class_id))
-            conn.commit()
+            catalogs_changed(conn)
             flash("Clase actualizada exitosamente.", "success")
         conn.close()
         return redirect(url_for('config_clases'))
@@ -777,7 +1172,7 @@ def edit_clase(class_id):
 def delete_clase(class_id):
     conn = get_db_connection()
     conn.execute("DELETE FROM classes WHERE id = ?", (class_id,))
-    conn.commit()
+    catalogs_changed(conn)
     conn.close()
     flash("Clase eliminada.", "warning")
     return redirect(url_for('config_clases'))
@@ -792,7 +1187,7 @@ def config_subclasses():
         name = request.form.get('name')
         if class_id and name:
             conn.execute("INSERT INTO subclasses (class_id, name) VALUES (?, ?)", (class_id, name))
-            conn.commit()
+            catalogs_changed(conn)
             flash("Subclase creada exitosamente.", "success")
         else:
             flash("Debe seleccionar una clase y escribir el nombre de la subclase.", "warning")
@@ -800,11 +1195,9 @@ def config_subclasses():
         return redirect(url_for('config_subclasses'))
     else:
         # Para el formulario, se listan todas las clases
-        classes = conn = get_db_connection()
-        classes = conn.execute("SELECT * FROM classes").fetchall()
-        subclasses = conn.execute("SELECT * FROM subclasses").fetchall()
         conn.close()
-        return render_template('config_subclasses.html', classes=classes, subclasses=subclasses)
+        cat = catalogs.registry.get()
+        return render_template('config_subclasses.html', classes=cat.classes, subclasses=cat.subclasses)
 
 # Editar una subclase
 @app.route('/config/subclasses/edit/<int:subclass_id>', methods=['GET', 'POST'])
@@ -828,15 +1221,15 @@ def edit_subclass(subclass_id):
                 "UPDATE subclasses SET name = ?, class_id = ? WHERE id = ?",
                 (new_name, new_class_id, subclass_id)
             )
-            conn.commit()
+            catalogs_changed(conn)
             flash("Subclase actualizada exitosamente.", "success")
             conn.close()
             return redirect(url_for('config_subclasses'))
     
     # 2. Si es GET (o POST con error), necesitamos la lista de clases para el dropdown
-    classes = conn.execute("SELECT * FROM classes").fetchall()
     conn.close()
-    return render_template('edit_subclass.html', subclass=subclass, classes=classes)
+    return render_template('edit_subclass.html', subclass=subclass,
+                           classes=catalogs.registry.get().classes)
 
 # Eliminar una subclase
 @app.route('/config/subclasses/delete/<int:subclass_id>', methods=['POST'])
@@ -844,7 +1237,7 @@ def edit_subclass(subclass_id):
 def delete_subclass(subclass_id):
     conn = get_db_connection()
     conn.execute("DELETE FROM subclasses WHERE id = ?", (subclass_id,))
-    conn.commit()
+    catalogs_changed(conn)
     conn.close()
     flash("Subclase eliminada.", "warning")
     return redirect(url_for('config_subclasses'))
@@ -859,16 +1252,15 @@ def config_statuses():
         name = request.form.get('name')
         if name:
             conn.execute("INSERT INTO statuses (name) VALUES (?)", (name,))
-            conn.commit()
+            catalogs_changed(conn)
             flash("Estatus agregado exitosamente.", "success")
         else:
             flash("El nombre del estatus es obligatorio.", "warning")
         conn.close()
         return redirect(url_for('config_statuses'))
     else:
-        statuses = conn.execute("SELECT * FROM statuses").fetchall()
         conn.close()
-        return render_template('config_statuses.html', statuses=statuses)
+        return render_template('config_statuses.html', statuses=catalogs.registry.get().statuses)
     
     # Editar un estatus
 @app.route('/config/statuses/edit/<int:status_id>', methods=['GET', 'POST'])
@@ -887,7 +1279,7 @@ def edit_status(status_id):
             flash("El nombre no puede estar vacío.", "warning")
         else:
             conn.execute("UPDATE statuses SET name = ? WHERE id = ?", (new_name, status_id))
-            conn.commit()
+            catalogs_changed(conn)
             flash("Estatus actualizado exitosamente.", "success")
         conn.close()
         return redirect(url_for('config_statuses'))
@@ -900,7 +1292,7 @@ def edit_status(status_id):
 def delete_status(status_id):
     conn = get_db_connection()
     conn.execute("DELETE FROM statuses WHERE id = ?", (status_id,))
-    conn.commit()
+    catalogs_changed(conn)
     conn.close()
     flash("Estatus eliminado.", "warning")
     return redirect(url_for('config_statuses'))
@@ -910,40 +1302,53 @@ def delete_status(status_id):
 @portfolio_required
 def replicate_assets(start_month, end_month):
     pid = session['portfolio_id']
+
+    # El formulario del listado envía los meses como parámetros GET
+    if 'start_month' in request.args or 'end_month' in request.args:
+        return redirect(url_for('replicate_assets',
+                                start_month=request.args.get('start_month', start_month),
+                                end_month=request.args.get('end_month', end_month)))
+
     conn = get_db_connection()
 
     if request.method == 'POST':
-        new_month = request.form['new_month'].strip()
-        selected = request.form.getlist('asset_ids')
-        for aid in selected:
-            row = conn.execute("""
-                SELECT amount, currency, status_id
-                  FROM asset_values
-                 WHERE asset_id = ? AND month = ?
-            """, (aid, start_month)).fetchone()
-            if row:
-                conn.execute("""
-                    INSERT OR IGNORE INTO asset_values
-                        (asset_id, month, amount, currency, status_id)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (aid, new_month,
-                      row['amount'],
-                      row['currency'],
-                      row['status_id']))
-        conn.commit()
+        # Se llenan todos los meses posteriores a start_month hasta end_month
+        end = request.form.get('end_month', end_month).strip()
+        selected = None if request.form.get('copy_all') else request.form.getlist('asset_ids')
+        dry_run = bool(request.form.get('dry_run'))
+        try:
+            growth_rate = float(request.form.get('growth_rate') or 0) / 100
+            result = bulk_ops.replicate_range(
+                conn, start_month, start_month, end, pid, selected,
+                mode=request.form.get('mode', 'carry'),
+                growth_rate=growth_rate,
+                fx_currency=request.form.get('fx_currency', 'USD'),
+                dry_run=dry_run
+            )
+        except ValueError as e:
+            conn.close()
+            flash("Parámetros de replicación inválidos: " + str(e), "warning")
+            return redirect(url_for('replicate_assets', start_month=start_month, end_month=end_month))
         conn.close()
-        flash(f"Activos replicados de {start_month} a {new_month}.", "success")
-        return redirect(url_for('assets_list'))
+
+        if dry_run:
+            flash(f"Simulación: se crearían {result['inserted']} valores en {len(result['months'])} meses "
+                  f"({result['skipped']} ya existen).", "info")
+            return redirect(url_for('replicate_assets', start_month=start_month, end_month=end))
+        flash(f"Activos replicados de {start_month} a {end}: {result['inserted']} nuevos en "
+              f"{len(result['months'])} meses, {result['skipped']} ya existían.", "success")
+        return redirect(url_for('assets_list', month=end))
 
     # GET: lista de origen
     base_assets = conn.execute("""
         SELECT
-          a.id             AS asset_id,
+          a.id             AS id,
           a.name           AS asset_name,
           a.location,
           av.amount,
           av.currency,
-          c.name           AS class_name,
+          av.month,
+          c.name           AS clase,
           sc.name          AS subclass_name,
           a.date_acquired  AS fecha_ingreso
         FROM asset_values av
@@ -960,9 +1365,11 @@ def replicate_assets(start_month, end_month):
         'copy_assets.html',   # ¡reusa la misma plantilla!
         assets=base_assets,
         prev_month=start_month,
-        default_new_month=end_month
+        default_new_month=end_month,
+        replicate=True,
+        form_action=url_for('replicate_assets', start_month=start_month, end_month=end_month)
     )
-        
+
 # ======================================================
 # BLOQUE FINAL: Inicia la APLICACIÓN.
 # ======================================================
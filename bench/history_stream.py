@@ -0,0 +1,77 @@
+# ======================================================
+# MEDICIÓN DEL HISTÓRICO EN STREAMING (500 activos x 60 meses)
+# ======================================================
+# Genera una base sintética temporal, pide /assets/history_view con el cliente
+# de pruebas de Flask y mide el tiempo al primer byte, el tiempo total y el
+# pico de memoria (tracemalloc). Termina con código 1 si se excede el presupuesto.
+#
+# Uso (desde la raíz del proyecto):
+#   python bench/history_stream.py [--assets 500] [--months 60]
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import database  # noqa: E402
+from synthetic import make_db  # noqa: E402
+
+TTFB_BUDGET_MS = 100
+TOTAL_BUDGET_MS = 1500
+PEAK_MEMORY_BUDGET_MB = 64
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--assets', type=int, default=500)
+    parser.add_argument('--months', type=int, default=60)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    database.db_path = os.path.join(tmp, 'bench.db')
+    make_db(database.db_path, assets=args.assets, months=args.months)
+
+    from app import app, users
+    client = app.test_client()
+    username, data = next(iter(users.items()))
+    client.post('/login', data={'username': username, 'password': data['password']})
+    client.get('/portfolios/select/1')
+    client.get('/assets/history_view')  # calentamiento: cachés y migraciones
+
+    # Tiempos sin tracemalloc (lo vuelve varias veces más lento); memoria aparte.
+    # Se vacía la caché de respuestas para medir la construcción de la página.
+    cache.response_cache.clear()
+    began = time.perf_counter()
+    resp = client.get('/assets/history_view', buffered=False)
+    chunks = iter(resp.response)
+    first = next(chunks)
+    ttfb = (time.perf_counter() - began) * 1000
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    resp.close()
+    total = (time.perf_counter() - began) * 1000
+
+    cache.response_cache.clear()
+    tracemalloc.start()
+    resp = client.get('/assets/history_view', buffered=False)
+    for _ in resp.response:
+        pass
+    resp.close()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+
+    print(f"{args.assets} activos x {args.months} meses, {size / 1024:.0f} KiB")
+    print(f"  primer byte: {ttfb:8.1f} ms  (presupuesto {TTFB_BUDGET_MS} ms)")
+    print(f"  total:       {total:8.1f} ms  (presupuesto {TOTAL_BUDGET_MS} ms)")
+    print(f"  pico memoria:{peak:8.1f} MB  (presupuesto {PEAK_MEMORY_BUDGET_MB} MB)")
+    over = ttfb > TTFB_BUDGET_MS or total > TOTAL_BUDGET_MS or peak > PEAK_MEMORY_BUDGET_MB
+    if over:
+        print("FUERA DE PRESUPUESTO")
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+# ======================================================
+# SUITE DE BENCHMARKS
+# ======================================================
+# Genera una base sintética (bench/synthetic.py) y mide, con el cliente de
+# pruebas de Flask, las rutas principales y, directamente, las funciones del
+# núcleo. Por caso reporta percentiles de latencia (p50/p95/p99), máximo y
+# operaciones por segundo. La caché de respuestas se vacía antes de cada
+# petición para medir la construcción de la página.
+#
+# Con --save se guarda el resultado como línea base en JSON; con --compare se
+# compara contra una línea base y termina con código 1 si algún p50 empeora más
+# que --tolerance (por defecto 25%).
+#
+# Uso (desde la raíz del proyecto):
+#   python bench/suite.py --assets 500 --months 60 --save bench/baseline.json
+#   python bench/suite.py --assets 500 --months 60 --compare bench/baseline.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk_ops  # noqa: E402
+import cache  # noqa: E402
+import database  # noqa: E402
+import history  # noqa: E402
+from synthetic import make_db, month_list  # noqa: E402
+
+DEFAULT_TOLERANCE = 0.25
+
+
+def percentile(sorted_values, pct):
+    """Percentil por interpolación lineal de una lista ya ordenada."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = (len(sorted_values) - 1) * pct / 100
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+def measure(func, repeat, setup=None, ops=1):
+    """
+    Ejecuta func() `repeat` veces (setup() antes de cada una, sin medirlo).
+    `ops` es cuántas operaciones hace cada llamada (para el throughput).
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        began = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - began)
+    times.sort()
+    ms = [t * 1000 for t in times]
+    return {
+        'repeat': repeat,
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'max_ms': round(ms[-1], 3),
+        'ops_per_s': round(ops * repeat / sum(times), 1) if sum(times) else None,
+    }
+
+
+def run(args):
+    tmp = tempfile.mkdtemp()
+    database.db_path = os.path.join(tmp, 'bench.db')
+    months = make_db(database.db_path, args.portfolios, args.assets, args.months,
+                     args.usd_share, args.rate_coverage, seed=args.seed)
+    last = months[-1]
+    # Meses posteriores a los datos: destino de copy_assets / replicate_assets
+    ahead = month_list(args.replicate_months, end=(datetime.strptime(last + "-01", "%Y-%m-%d")
+                       + relativedelta(months=args.replicate_months)).strftime("%Y-%m"))
+
+    import app as webapp
+    client = webapp.app.test_client()
+    username, data = next(iter(webapp.users.items()))
+    client.post('/login', data={'username': username, 'password': data['password']})
+    client.get('/portfolios/select/1')
+    conn = database.get_db_connection()
+    asset_id = conn.execute("SELECT MIN(id) FROM assets WHERE portfolio_id = 1").fetchone()[0]
+    conn.close()
+
+    def get(url):
+        def call():
+            cache.response_cache.clear()
+            resp = client.get(url)
+            resp.get_data()
+            resp.close()
+            assert resp.status_code == 200, (url, resp.status_code)
+        return call
+
+    def post(url, form):
+        def call():
+            resp = client.post(url, data=form)
+            resp.close()
+            assert resp.status_code == 302, (url, resp.status_code)
+        return call
+
+    def drop_future():
+        # Deja el portafolio como estaba antes de copiar o replicar
+        conn = database.get_db_connection()
+        conn.execute("""
+            DELETE FROM asset_values
+             WHERE month > ? AND asset_id IN (SELECT id FROM assets WHERE portfolio_id = 1)
+        """, (last,))
+        conn.commit()
+        conn.close()
+
+    def rates_lookup():
+        for month in months:
+            webapp.get_exchange_rate(month)
+
+    def history_build():
+        conn = database.get_db_connection()
+        try:
+            history.build(conn, 1)
+        finally:
+            conn.close()
+
+    def copy_month():
+        conn = database.get_db_connection()
+        try:
+            bulk_ops.copy_month(conn, last, ahead[0], 1)
+        finally:
+            conn.close()
+
+    # Calentamiento: migraciones, cachés de tipo de cambio y de catálogos
+    for url in ('/assets/list', '/assets/history_view', f'/assets/edit/{asset_id}'):
+        get(url)()
+
+    r = args.repeat
+    cases = {
+        'route:assets_list': lambda: measure(get('/assets/list'), r),
+        'route:assets_list_data': lambda: measure(
+            get('/api/assets/list?draw=1&start=0&length=50&order[0][column]=0&order[0][dir]=asc'), r),
+        'route:assets_history_view': lambda: measure(get('/assets/history_view'), r),
+        'route:edit_asset': lambda: measure(get(f'/assets/edit/{asset_id}'), r),
+        'route:copy_assets': lambda: measure(
+            post('/assets/copy', {'new_month': ahead[0], 'copy_all': '1'}), r, setup=drop_future),
+        'route:replicate_assets': lambda: measure(
+            post(f'/assets/replicate/{last}/{ahead[-1]}',
+                 {'end_month': ahead[-1], 'copy_all': '1', 'mode': 'carry'}), r, setup=drop_future),
+        'func:get_exchange_rate': lambda: measure(rates_lookup, r, ops=len(months)),
+        'func:history.build': lambda: measure(history_build, r),
+        'func:bulk_ops.copy_month': lambda: measure(copy_month, r, setup=drop_future),
+    }
+    results = {}
+    for name, case in cases.items():
+        if args.only and not any(key in name for key in args.only):
+            continue
+        results[name] = case()
+        print(f"{name:28} p50 {results[name]['p50_ms']:9.2f} ms  p95 {results[name]['p95_ms']:9.2f} ms  "
+              f"p99 {results[name]['p99_ms']:9.2f} ms  {results[name]['ops_per_s']:>10} ops/s")
+    drop_future()
+
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': {'portfolios': args.portfolios, 'assets': args.assets, 'months': args.months,
+                      'usd_share': args.usd_share, 'rate_coverage': args.rate_coverage,
+                      'seed': args.seed, 'repeat': args.repeat},
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Imprime la comparación por caso; devuelve los casos cuyo p50 empeoró más de `tolerance`."""
+    if current['meta']['scale'] != baseline['meta']['scale']:
+        print("Aviso: la escala difiere de la línea base:", baseline['meta']['scale'])
+    regressions = []
+    print(f"\n{'caso':28} {'base p50':>10} {'actual':>10} {'cambio':>8}")
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            print(f"{name:28} {'-':>10} {result['p50_ms']:10.2f}   (nuevo)")
+            continue
+        change = result['p50_ms'] / base['p50_ms'] - 1 if base['p50_ms'] else 0.0
+        flag = "  REGRESIÓN" if change > tolerance else ""
+        print(f"{name:28} {base['p50_ms']:10.2f} {result['p50_ms']:10.2f} {change:+8.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de rutas y funciones principales.")
+    parser.add_argument('--portfolios', type=int, default=1)
+    parser.add_argument('--assets', type=int, default=500)
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--usd-share', type=float, default=0.67)
+    parser.add_argument('--rate-coverage', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--replicate-months', type=int, default=6,
+                        help="Meses a llenar en el caso replicate_assets")
+    parser.add_argument('--only', nargs='*', help="Sólo los casos que contengan alguno de estos textos")
+    parser.add_argument('--save', help="Guarda el resultado como línea base JSON")
+    parser.add_argument('--compare', help="Compara contra una línea base JSON")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nLínea base guardada en {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} caso(s) más lentos que la línea base (> {args.tolerance:.0%})")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
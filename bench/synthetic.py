@@ -0,0 +1,109 @@
+# ======================================================
+# GENERADOR DE PORTAFOLIOS SINTÉTICOS
+# ======================================================
+# Crea una base SQLite con el esquema actual (migrations.migrate) y datos de
+# tamaño configurable: portafolios x activos x meses, proporción de valores en
+# USD/MXN y cobertura del tipo de cambio (fracción de meses con tasa). Los
+# datos son reproducibles para una misma semilla.
+#
+# Uso (desde la raíz del proyecto):
+#   python bench/synthetic.py bench.db --portfolios 3 --assets 500 --months 60
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations  # noqa: E402
+
+CLASSES = {
+    'Financiero': ['Acciones', 'Bonos', 'Fondos'],
+    'Inmuebles': ['Casa', 'Terreno'],
+    'Otros': ['Vehículos', 'Arte'],
+}
+STATUSES = ['Activo', 'Vendido']
+
+
+def month_list(months, end=None):
+    """Los `months` meses AAAA-MM que terminan en `end` (por defecto el mes actual)."""
+    last = datetime.strptime((end or datetime.now().strftime("%Y-%m")) + "-01", "%Y-%m-%d")
+    return [(last - relativedelta(months=k)).strftime("%Y-%m") for k in range(months - 1, -1, -1)]
+
+
+def make_db(path, portfolios=1, assets=500, months=60, usd_share=0.67,
+            rate_coverage=1.0, end=None, seed=0):
+    """
+    Genera la base en `path` (que no debe existir). Cada portafolio tiene
+    `assets` activos con valor en cada uno de los `months` meses que terminan
+    en `end`. Devuelve la lista de meses.
+    """
+    rnd = random.Random(seed)
+    month_keys = month_list(months, end)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+
+    subclass_ids = []
+    for class_name, subclasses in CLASSES.items():
+        class_id = conn.execute("INSERT INTO classes (name) VALUES (?)", (class_name,)).lastrowid
+        for name in subclasses:
+            subclass_ids.append((class_id, conn.execute(
+                "INSERT INTO subclasses (class_id, name) VALUES (?, ?)", (class_id, name)).lastrowid))
+    status_ids = [conn.execute("INSERT INTO statuses (name) VALUES (?)", (name,)).lastrowid
+                  for name in STATUSES]
+
+    conn.executemany("INSERT INTO exchange_rate (month, rate) VALUES (?, ?)",
+                     [(m, round(rnd.uniform(16.5, 21.0), 4)) for m in month_keys
+                      if rnd.random() < rate_coverage])
+
+    for p in range(1, portfolios + 1):
+        pid = conn.execute("INSERT INTO portfolios (name) VALUES (?)", (f"Bench {p}",)).lastrowid
+        rows = []
+        for i in range(1, assets + 1):
+            class_id, subclass_id = subclass_ids[i % len(subclass_ids)]
+            rows.append((f"Activo {i:04d}", f"Ubicación {i % 10}", month_keys[0],
+                         class_id, subclass_id, pid))
+        conn.executemany("""
+            INSERT INTO assets (name, location, date_acquired, class_id, subclass_id, portfolio_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        asset_ids = [r[0] for r in conn.execute(
+            "SELECT id FROM assets WHERE portfolio_id = ? ORDER BY id", (pid,))]
+        for asset_id in asset_ids:
+            currency = 'USD' if rnd.random() < usd_share else 'MXN'
+            amount = rnd.uniform(1e3, 1e6) * (18 if currency == 'MXN' else 1)
+            values = []
+            for m in month_keys:
+                amount *= 1 + rnd.gauss(0.004, 0.03)
+                values.append((asset_id, m, round(amount, 2), currency, status_ids[0]))
+            conn.executemany(
+                "INSERT INTO asset_values (asset_id, month, amount, currency, status_id) VALUES (?, ?, ?, ?, ?)",
+                values)
+        conn.commit()
+    conn.close()
+    return month_keys
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera una base de datos sintética.")
+    parser.add_argument('path')
+    parser.add_argument('--portfolios', type=int, default=1)
+    parser.add_argument('--assets', type=int, default=500)
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--usd-share', type=float, default=0.67, help="Fracción de activos en USD")
+    parser.add_argument('--rate-coverage', type=float, default=1.0,
+                        help="Fracción de meses con tipo de cambio registrado")
+    parser.add_argument('--end', help="Último mes AAAA-MM (por defecto el actual)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} ya existe")
+    keys = make_db(args.path, args.portfolios, args.assets, args.months, args.usd_share,
+                   args.rate_coverage, args.end, args.seed)
+    print(f"{args.path}: {args.portfolios} portafolios x {args.assets} activos x "
+          f"{len(keys)} meses ({keys[0]} a {keys[-1]}).")
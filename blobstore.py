@@ -0,0 +1,138 @@
+# ======================================================
+# ALMACÉN DE ADJUNTOS POR CONTENIDO (sha256)
+# ======================================================
+# Cada archivo subido se copia a disco por bloques mientras se calcula su
+# sha256, y se guarda una sola vez en <raíz>/<ab>/<cd>/<sha256>: el mismo
+# estado de cuenta adjuntado a diez activos ocupa el espacio de uno, y dos
+# archivos con el mismo nombre ya no se pisan.
+#
+# La tabla blobs lleva un contador de referencias que mantienen los triggers
+# de attachments (migración 5): al insertar un adjunto sube, al borrarlo (o al
+# borrar el activo, por ON DELETE CASCADE) baja. collect_garbage borra los
+# blobs sin referencias y sus archivos.
+#
+# Archivo y fila se manejan siempre con el candado de escritura de SQLite:
+# register da de alta la fila y decide si reutilizar el archivo dentro de la
+# transacción del adjunto, y collect_garbage / discard borran archivos dentro
+# de la suya. Así un blob no puede quedar registrado sin su archivo.
+#
+# La memoria usada no depende del tamaño del archivo (se lee en bloques de
+# CHUNK_SIZE) y cada archivo está acotado por MAX_BYTES
+# (app.config['ATTACHMENT_MAX_BYTES']).
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 1 << 20
+MAX_BYTES = 100 * 2**20
+
+
+class TooLarge(ValueError):
+    pass
+
+
+def relative_path(sha256):
+    return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+
+def blob_path(root, sha256):
+    return os.path.join(root, relative_path(sha256))
+
+
+def save_stream(root, stream, max_bytes=MAX_BYTES):
+    """
+    Copia `stream` a un archivo temporal del almacén calculando su sha256.
+    Devuelve (sha256, tamaño, ruta temporal); register lo coloca en su lugar.
+    Lanza TooLarge si pasa de `max_bytes` (no deja nada en disco).
+    """
+    tmp_dir = os.path.join(root, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise TooLarge(f"El archivo pasa del máximo de {max_bytes:,} bytes.")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return digest.hexdigest(), size, tmp_path
+
+
+def register(conn, root, sha256, size, tmp_path, mimetype=None):
+    """
+    Da de alta el blob dentro de la transacción actual (el INSERT toma el
+    candado de escritura) y coloca el archivo temporal en su lugar, o lo
+    descarta si el contenido ya estaba guardado. Devuelve True si el
+    contenido es nuevo.
+    """
+    conn.execute("""
+        INSERT INTO blobs (sha256, size, mimetype) VALUES (?, ?, ?)
+        ON CONFLICT(sha256) DO NOTHING
+    """, (sha256, size, mimetype))
+    path = blob_path(root, sha256)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)  # atómico: nunca queda un blob a medias
+    return True
+
+
+def discard(conn, root, sha256, tmp_path=None):
+    """
+    Tras un rollback: borra el temporal y el archivo del blob si ninguna fila
+    de blobs lo registra.
+    """
+    if tmp_path and os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone() is None:
+            _remove(blob_path(root, sha256))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def collect_garbage(conn, root):
+    """Borra los blobs sin referencias y sus archivos. Devuelve cuántos borró."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        orphans = [row[0] for row in conn.execute("SELECT sha256 FROM blobs WHERE refcount <= 0")]
+        conn.executemany("DELETE FROM blobs WHERE sha256 = ?", [(s,) for s in orphans])
+        # Los archivos se borran con el candado tomado: nadie puede registrarlos a la vez
+        for sha256 in orphans:
+            _remove(blob_path(root, sha256))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(orphans)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def stats(conn):
+    """Espacio en disco vs. espacio referenciado (lo que ocuparía sin deduplicar)."""
+    row = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(b.size), 0),
+               (SELECT COALESCE(SUM(b2.size), 0)
+                  FROM attachments a JOIN blobs b2 ON b2.sha256 = a.sha256)
+          FROM blobs b
+    """).fetchone()
+    return {'blobs': row[0], 'stored_bytes': row[1], 'referenced_bytes': row[2]}
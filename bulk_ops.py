@@ -0,0 +1,433 @@
+# ======================================================
+# OPERACIONES MASIVAS SOBRE asset_values
+# ======================================================
+# Cada operación se resuelve con sentencias de conjunto (INSERT ... SELECT)
+# dentro de una sola transacción, en lugar de un SELECT + INSERT por activo.
+# El conjunto de IDs seleccionados viaja como un arreglo JSON y se expande en
+# SQL con json_each().
+import csv
+import io
+import json
+import re
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+import fx
+from cache import bump_data_version
+
+# Filtro común: valores del mes origen para los activos (opcionalmente
+# seleccionados) del portafolio.
+SOURCE_WHERE = """
+      FROM asset_values av
+      JOIN assets a ON a.id = av.asset_id
+     WHERE av.month = :src
+       AND a.portfolio_id = :pid
+       AND (:ids IS NULL OR av.asset_id IN (SELECT value FROM json_each(:ids)))
+"""
+
+# Modos de replicación de montos (ver replicate_range)
+REPLICATION_MODES = ('carry', 'growth', 'fx')
+
+# Monedas que aceptan los formularios de captura
+CURRENCIES = ('MXN', 'USD')
+
+MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+# Escribe el valor del mes; si ya existe sólo cambian monto y moneda (el
+# estatus se conserva salvo que se indique uno).
+UPSERT_MONTH_VALUE = """
+    INSERT INTO asset_values (asset_id, month, amount, currency, status_id)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(asset_id, month) DO UPDATE SET
+        amount    = excluded.amount,
+        currency  = excluded.currency,
+        status_id = COALESCE(excluded.status_id, asset_values.status_id)
+"""
+
+# Encabezados aceptados en CSV / tablas pegadas -> campo
+VALUE_COLUMNS = {
+    'asset_id': 'asset_id', 'id': 'asset_id',
+    'asset_name': 'asset_name', 'name': 'asset_name', 'activo': 'asset_name', 'nombre': 'asset_name',
+    'amount': 'amount', 'monto': 'amount', 'valor': 'amount',
+    'currency': 'currency', 'moneda': 'currency',
+    'status': 'status', 'estatus': 'status',
+}
+
+
+def _ids_param(asset_ids):
+    """Arreglo JSON de IDs enteros, o None para 'todos los activos'."""
+    if asset_ids is None:
+        return None
+    return json.dumps([int(aid) for aid in asset_ids])
+
+
+def parse_amount(value):
+    """
+    Monto capturado como número o texto ('1,234.50', '$ 1234'). Lanza
+    ValueError si no es un número finito (en lugar de convertirlo en 0).
+    """
+    if isinstance(value, (int, float)):
+        amount = float(value)
+    else:
+        text = str(value if value is not None else '').replace(',', '').replace('$', '').strip()
+        if not text:
+            raise ValueError("monto vacío")
+        try:
+            amount = float(text)
+        except ValueError:
+            raise ValueError(f"monto inválido: {value!r}")
+    if amount != amount or amount in (float('inf'), float('-inf')):
+        raise ValueError(f"monto inválido: {value!r}")
+    return amount
+
+
+def diff_values(stored, submitted):
+    """
+    Compara los valores capturados contra los guardados de un activo.
+    `stored` es {mes: (monto, moneda)} y `submitted` una secuencia de
+    (mes, monto en texto, moneda). Devuelve (cambios, errores): cada cambio es
+    un dict con month, amount, currency, old_amount y old_currency; cada error
+    es un texto 'mes: motivo'. Los meses sin cambios no aparecen.
+    """
+    changes, errors = [], []
+    for month, amount_text, currency in submitted:
+        month = (month or '').strip()
+        if month not in stored:
+            errors.append(f"{month or '(sin mes)'}: el mes no tiene valor registrado")
+            continue
+        old_amount, old_currency = stored[month]
+        currency = (currency or '').strip().upper()
+        if old_amount is None and not str(amount_text or '').strip():
+            amount = None  # sigue sin monto
+        else:
+            try:
+                amount = parse_amount(amount_text)
+            except ValueError as e:
+                errors.append(f"{month}: {e}")
+                continue
+        if amount == old_amount and currency == (old_currency or '').strip().upper():
+            continue  # sin cambio: filas antiguas con otra moneda (o sin moneda) pasan tal cual
+        if currency not in CURRENCIES:
+            errors.append(f"{month}: moneda inválida {currency!r}")
+            continue
+        if amount != old_amount or currency != old_currency:
+            changes.append({'month': month, 'amount': amount, 'currency': currency,
+                            'old_amount': old_amount, 'old_currency': old_currency})
+    return changes, errors
+
+
+def apply_value_changes(conn, asset_id, changes):
+    """
+    Escribe los cambios de diff_values con un solo executemany. No confirma:
+    el llamador decide la transacción. Devuelve el número de filas escritas.
+    """
+    cursor = conn.executemany("""
+        UPDATE asset_values
+           SET amount   = ?,
+               currency = ?
+         WHERE asset_id = ? AND month = ?
+    """, [(c['amount'], c['currency'], asset_id, c['month']) for c in changes])
+    return cursor.rowcount
+
+
+def read_value_rows(text):
+    """
+    Filas (dict con asset_id / asset_name, amount, currency, status) de un CSV
+    o de una tabla pegada desde una hoja de cálculo (separada por tabuladores,
+    comas o punto y coma). Requiere encabezados; ver VALUE_COLUMNS.
+    """
+    sample = text[:4096]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters="\t,;")
+    except csv.Error:
+        dialect = csv.excel_tab if '\t' in sample else csv.excel
+    reader = csv.reader(io.StringIO(text.lstrip('\ufeff')), dialect)
+    header = next(reader, [])
+    fields = [VALUE_COLUMNS.get(h.strip().lower()) for h in header]
+    if 'amount' not in fields or not ({'asset_id', 'asset_name'} & set(fields)):
+        raise ValueError("Se requieren columnas de monto (amount) y de activo (asset_id o asset_name).")
+    rows = []
+    for values in reader:
+        if not any(v.strip() for v in values):
+            continue
+        rows.append({f: v.strip() for f, v in zip(fields, values) if f})
+    return rows
+
+
+def month_values(conn, portfolio_id, month):
+    """
+    En un solo query, los activos del portafolio con su valor en `month`
+    (amount NULL si no tiene), la moneda y el estatus vigentes (los del mes o
+    los últimos registrados) y el último monto anterior como referencia.
+    """
+    return conn.execute("""
+        SELECT a.id,
+               a.name AS asset_name,
+               av.amount,
+               COALESCE(av.currency, prev.currency) AS currency,
+               COALESCE(av.status_id, prev.status_id) AS status_id,
+               prev.amount AS prev_amount,
+               prev.month  AS prev_month
+          FROM assets a
+          LEFT JOIN asset_values av
+            ON av.asset_id = a.id AND av.month = :month
+          LEFT JOIN asset_values prev
+            ON prev.asset_id = a.id
+           AND prev.month = (SELECT MAX(p.month) FROM asset_values p
+                              WHERE p.asset_id = a.id AND p.month < :month)
+         WHERE a.portfolio_id = :pid
+         ORDER BY a.name
+    """, {'month': month, 'pid': portfolio_id}).fetchall()
+
+
+def revalue_month(conn, portfolio_id, month, entries, status_ids=None, create_asset=None,
+                  before_commit=None):
+    """
+    Revaluación masiva: aplica a `month` los montos de `entries` (dicts con
+    asset_id o asset_name, amount y opcionalmente currency y status) para
+    activos del portafolio, con un solo UPSERT en una transacción.
+
+    Los nombres se resuelven con un índice nombre -> id construido una vez.
+    Sin moneda se conserva la del mes (o la última registrada) y los meses
+    nuevos heredan el último estatus. `status_ids` es {nombre en minúsculas:
+    id} para la columna status; `create_asset(nombre)` (opcional) crea los
+    activos que no existen y devuelve su ID. `before_commit(conn)` (opcional)
+    se ejecuta dentro de la transacción, justo antes del commit.
+
+    Las filas inválidas no detienen a las demás: se devuelven en `errors` con
+    su número de fila (1 = primera). Devuelve {'month', 'received', 'matched',
+    'created', 'unmatched', 'applied', 'unchanged', 'errors'}.
+    """
+    if not isinstance(month, str) or not MONTH_RE.match(month):
+        raise ValueError(f"Mes inválido: {month!r} (formato AAAA-MM)")
+    result = {'month': month, 'received': len(entries), 'matched': 0, 'created': 0,
+              'unmatched': 0, 'applied': 0, 'unchanged': 0, 'errors': []}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current, statuses, by_name = {}, {}, {}
+        for r in month_values(conn, portfolio_id, month):
+            current[r['id']] = (r['amount'], r['currency'])
+            statuses[r['id']] = r['status_id']
+            by_name.setdefault(r['asset_name'].strip().lower(), r['id'])
+
+        batch, seen = [], {}
+        for n, entry in enumerate(entries, start=1):
+            label = entry.get('asset_id') or entry.get('asset_name') or ''
+            new_name = None
+            try:
+                asset_id = _match_asset(entry, current, by_name)
+                result['matched'] += 1
+            except LookupError as e:
+                name = str(entry.get('asset_name') or '').strip()
+                if create_asset is None or not name or entry.get('asset_id'):
+                    result['unmatched'] += 1
+                    result['errors'].append({'row': n, 'asset': str(label), 'error': str(e)})
+                    continue
+                # El activo se crea sólo si la fila resulta válida (abajo)
+                asset_id, new_name = None, name
+            except ValueError as e:
+                result['errors'].append({'row': n, 'asset': str(label), 'error': str(e)})
+                continue
+            try:
+                if asset_id in seen:
+                    raise ValueError(f"activo repetido (fila {seen[asset_id]})")
+                if asset_id is not None:
+                    seen[asset_id] = n
+                amount = parse_amount(entry.get('amount'))
+                old_currency = current[asset_id][1] if asset_id is not None else None
+                currency = str(entry.get('currency') or '').strip().upper() or old_currency or 'USD'
+                if currency not in CURRENCIES:
+                    raise ValueError(f"moneda inválida {currency!r}")
+                status_id = statuses.get(asset_id)
+                status = str(entry.get('status') or '').strip()
+                if status:
+                    if status.lower() not in (status_ids or {}):
+                        raise ValueError(f"estatus desconocido {status!r}")
+                    status_id = status_ids[status.lower()]
+            except ValueError as e:
+                result['errors'].append({'row': n, 'asset': str(label), 'error': str(e)})
+                continue
+            if new_name is not None:
+                asset_id = create_asset(new_name)
+                current[asset_id] = (None, None)
+                statuses[asset_id] = None
+                by_name[new_name.lower()] = asset_id
+                seen[asset_id] = n
+                result['created'] += 1
+            if current[asset_id] == (amount, currency) and status_id == statuses[asset_id]:
+                result['unchanged'] += 1
+                continue
+            batch.append((asset_id, month, amount, currency, status_id))
+
+        conn.executemany(UPSERT_MONTH_VALUE, batch)
+        if batch or result['created']:
+            bump_data_version(conn, portfolio_id)
+        if before_commit is not None:
+            before_commit(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    result['applied'] = len(batch)
+    return result
+
+
+def _match_asset(entry, current, by_name):
+    """
+    ID del activo de una fila (por ID o por nombre sin distinguir mayúsculas).
+    LookupError si no existe en el portafolio; ValueError si la fila no sirve.
+    """
+    raw_id = str(entry.get('asset_id') or '').strip()
+    if raw_id:
+        try:
+            asset_id = int(raw_id)
+        except ValueError:
+            raise ValueError(f"ID de activo inválido {raw_id!r}")
+        if asset_id not in current:
+            raise LookupError(f"el activo {asset_id} no existe en el portafolio")
+        return asset_id
+    name = str(entry.get('asset_name') or '').strip()
+    if not name:
+        raise ValueError("falta el activo (asset_id o asset_name)")
+    if name.lower() not in by_name:
+        raise LookupError(f"no hay un activo llamado {name!r} en el portafolio")
+    return by_name[name.lower()]
+
+
+def copy_month(conn, src, dest, portfolio_id, asset_ids=None):
+    """
+    Copia los valores del mes `src` al mes `dest` para los activos del portafolio.
+    Si `asset_ids` es None se copia el portafolio completo. Los activos que ya
+    tienen valor en `dest` se omiten (INSERT OR IGNORE).
+    Devuelve {'source': filas origen, 'inserted': insertadas, 'skipped': omitidas}.
+    """
+    params = {'src': src, 'dest': dest, 'pid': portfolio_id, 'ids': _ids_param(asset_ids)}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        source = conn.execute("SELECT COUNT(*) " + SOURCE_WHERE, params).fetchone()[0]
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO asset_values
+                (asset_id, month, amount, currency, status_id)
+            SELECT av.asset_id, :dest, av.amount, av.currency, av.status_id
+        """ + SOURCE_WHERE, params)
+        if cursor.rowcount:
+            bump_data_version(conn, portfolio_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    inserted = cursor.rowcount
+    return {'source': source, 'inserted': inserted, 'skipped': source - inserted}
+
+
+def month_range(start, end):
+    """Lista de meses AAAA-MM desde start hasta end inclusive."""
+    curr = datetime.strptime(start + "-01", "%Y-%m-%d")
+    last = datetime.strptime(end + "-01", "%Y-%m-%d")
+    months = []
+    while curr <= last:
+        months.append(curr.strftime("%Y-%m"))
+        curr += relativedelta(months=1)
+    return months
+
+
+def _month_factors(src, months, mode, growth_rate, fx_currency):
+    """
+    Factor por el que se multiplica el monto origen en cada mes destino, por moneda.
+    - carry:  se arrastra el mismo monto.
+    - growth: crecimiento compuesto de `growth_rate` (p.ej. 0.01 = 1%) por mes.
+    - fx:     se conserva constante el valor en `fx_currency` usando el tipo de
+              cambio de cada mes (los montos en la otra moneda se reajustan);
+              los meses sin tipo de cambio registrado arrastran el monto.
+    """
+    if mode not in REPLICATION_MODES:
+        raise ValueError(f"Modo de replicación desconocido: {mode}")
+    rates = fx.rate_cache.snapshot()
+    base_rate = fx.known_rate(rates, src)
+    targets = []
+    for k, month in enumerate(months, start=1):
+        mxn = usd = other = 1.0
+        if mode == 'growth':
+            mxn = usd = other = (1 + growth_rate) ** k
+        elif mode == 'fx':
+            rate = fx.known_rate(rates, month)
+            # Sin tipo de cambio (origen o destino) no hay ajuste posible: se arrastra
+            if base_rate and rate:
+                if fx_currency == 'USD':
+                    mxn = rate / base_rate
+                else:
+                    usd = base_rate / rate
+        targets.append({'month': month, 'mxn': mxn, 'usd': usd, 'other': other})
+    return targets
+
+
+def replicate_range(conn, src, start, end, portfolio_id, asset_ids=None,
+                    mode='carry', growth_rate=0.0, fx_currency='USD', dry_run=False):
+    """
+    Replica los valores del mes `src` a todos los meses de `start` a `end`
+    (inclusive) en una sola pasada: un INSERT ... SELECT que cruza las filas
+    origen con la lista de meses destino, dentro de una sola transacción.
+    Los meses que ya tienen valor para un activo se respetan.
+
+    Con dry_run=True no escribe nada y sólo devuelve el plan.
+    Devuelve {'months', 'source', 'planned', 'inserted', 'skipped', 'dry_run'}.
+    """
+    months = [m for m in month_range(start, end) if m != src]
+    targets = json.dumps(_month_factors(src, months, mode, growth_rate, fx_currency))
+    params = {'src': src, 'pid': portfolio_id, 'ids': _ids_param(asset_ids), 'targets': targets}
+    # Meses destino con sus factores, expandidos desde JSON
+    target_rows = """
+        (SELECT json_extract(value, '$.month') AS month,
+                json_extract(value, '$.mxn')   AS f_mxn,
+                json_extract(value, '$.usd')   AS f_usd,
+                json_extract(value, '$.other') AS f_other
+           FROM json_each(:targets)) t
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        planned, existing = conn.execute("""
+            SELECT COUNT(*),
+                   COALESCE(SUM(EXISTS (SELECT 1 FROM asset_values x
+                                         WHERE x.asset_id = av.asset_id
+                                           AND x.month = t.month)), 0)
+              FROM """ + target_rows + """, asset_values av
+              JOIN assets a ON a.id = av.asset_id
+             WHERE av.month = :src
+               AND a.portfolio_id = :pid
+               AND (:ids IS NULL OR av.asset_id IN (SELECT value FROM json_each(:ids)))
+        """, params).fetchone()
+        source = conn.execute("SELECT COUNT(*) " + SOURCE_WHERE, params).fetchone()[0]
+        if dry_run:
+            conn.rollback()
+            inserted = planned - existing
+        else:
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO asset_values
+                    (asset_id, month, amount, currency, status_id)
+                SELECT av.asset_id, t.month,
+                       av.amount * CASE av.currency WHEN 'MXN' THEN t.f_mxn
+                                                    WHEN 'USD' THEN t.f_usd
+                                                    ELSE t.f_other END,
+                       av.currency, av.status_id
+                  FROM """ + target_rows + """, asset_values av
+                  JOIN assets a ON a.id = av.asset_id
+                 WHERE av.month = :src
+                   AND a.portfolio_id = :pid
+                   AND (:ids IS NULL OR av.asset_id IN (SELECT value FROM json_each(:ids)))
+            """, params)
+            if cursor.rowcount:
+                bump_data_version(conn, portfolio_id)
+            conn.commit()
+            inserted = cursor.rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    return {
+        'months': months,
+        'source': source,
+        'planned': planned,
+        'inserted': inserted,
+        'skipped': planned - inserted,
+        'dry_run': dry_run,
+    }
@@ -0,0 +1,221 @@
+# ======================================================
+# CACHÉ DE RESPUESTAS POR VERSIÓN DE DATOS
+# ======================================================
+# Los datos cambian pocas veces al mes, pero el listado y el histórico se
+# reconstruían en cada visita. Cada escritura incrementa una versión de datos
+# guardada en la tabla data_versions (global para tipo de cambio y catálogos,
+# y una por portafolio para sus activos); las páginas se guardan en memoria con
+# una llave que incluye esa versión, así nunca se sirve una página desfasada.
+#
+# Además cada respuesta lleva un ETag derivado de la llave: si el navegador ya
+# tiene esa versión recibe un 304 sin cuerpo.
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from database import get_db_connection
+
+# Tamaño máximo (bytes de cuerpo) que ocupa la caché; ajustable con
+# app.config['RESPONSE_CACHE_MAX_BYTES'].
+RESPONSE_CACHE_MAX_BYTES = 32 * 2**20
+
+GLOBAL_SCOPE = 'global'
+
+
+def _scope(portfolio_id):
+    return GLOBAL_SCOPE if portfolio_id is None else f"portfolio:{portfolio_id}"
+
+
+def bump_data_version(conn, portfolio_id=None):
+    """
+    Marca que cambiaron los datos de un portafolio (o, sin portafolio, datos
+    compartidos por todos: tipo de cambio, catálogos). No confirma: debe
+    ejecutarse dentro de la transacción de la escritura, antes de su commit,
+    para que los datos nuevos y la versión nueva sean visibles a la vez.
+    """
+    conn.execute("""
+        INSERT INTO data_versions (scope, version) VALUES (?, 1)
+        ON CONFLICT(scope) DO UPDATE SET version = version + 1
+    """, (_scope(portfolio_id),))
+
+
+def data_version(conn, portfolio_id=None):
+    """Versión combinada (global + portafolio) como texto, p.ej. 'g3.p12'."""
+    rows = dict(conn.execute(
+        "SELECT scope, version FROM data_versions WHERE scope IN (?, ?)",
+        (GLOBAL_SCOPE, _scope(portfolio_id))
+    ).fetchall())
+    return f"g{rows.get(GLOBAL_SCOPE, 0)}.p{rows.get(_scope(portfolio_id), 0)}"
+
+
+def data_versions(conn, portfolio_ids):
+    """data_version de varios portafolios con un solo query: {id: 'g3.p12', ...}."""
+    scopes = [_scope(pid) for pid in portfolio_ids]
+    rows = dict(conn.execute(
+        "SELECT scope, version FROM data_versions WHERE scope IN (%s)" % ",".join("?" * (len(scopes) + 1)),
+        [GLOBAL_SCOPE] + scopes
+    ).fetchall())
+    return {pid: f"g{rows.get(GLOBAL_SCOPE, 0)}.p{rows.get(scope, 0)}"
+            for pid, scope in zip(portfolio_ids, scopes)}
+
+
+class ResponseCache:
+    """Caché LRU de cuerpos de respuesta, acotada por el total de bytes."""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._entries[key] = (body, mimetype)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.bytes,
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+response_cache = ResponseCache()
+
+
+class Memo:
+    """
+    Caché LRU de resultados calculados (no de respuestas HTTP), acotada por
+    número de entradas. La llave debe incluir la versión de datos
+    (data_version) para que un cambio en los datos nunca devuelva un
+    resultado viejo.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        # Se calcula fuera del candado: dos peticiones simultáneas pueden
+        # calcular lo mismo, pero ninguna bloquea a las demás.
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def init_app(app):
+    """Toma el tamaño de la caché de app.config['RESPONSE_CACHE_MAX_BYTES']."""
+    response_cache.max_bytes = app.config.setdefault('RESPONSE_CACHE_MAX_BYTES', RESPONSE_CACHE_MAX_BYTES)
+
+
+def cached_view(view):
+    """
+    Decorador para vistas GET que dependen sólo del portafolio en sesión, de la
+    URL y de los datos. La llave es (vista, usuario, portafolio, URL, mes
+    actual, versión de datos). Si hay mensajes flash pendientes no se usa la
+    caché: la página los mostraría de nuevo.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        portfolio_id = session.get('portfolio_id')
+        version = data_version(get_db_connection(), portfolio_id)
+        key = (request.endpoint, current_user.get_id(), portfolio_id, request.full_path,
+               datetime.now().strftime("%Y-%m"), version)
+        etag = hashlib.sha1(repr(key).encode()).hexdigest()
+
+        if etag in request.if_none_match:
+            resp = current_app.response_class(status=304)
+        else:
+            hit = response_cache.get(key)
+            if hit is not None:
+                resp = current_app.response_class(hit[0], mimetype=hit[1])
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code == 200:
+                    _store(resp, key)
+        resp.set_etag(etag)
+        # El navegador puede guardar la página, pero debe revalidarla cada vez
+        resp.headers['Cache-Control'] = 'private, no-cache'
+        return resp
+    return wrapper
+
+
+def _store(resp, key):
+    if not resp.is_streamed:
+        response_cache.put(key, resp.get_data(), resp.mimetype)
+        return
+    # Respuesta en streaming: se guarda una copia al terminar de enviarla
+    source = resp.response
+
+    def tee():
+        chunks = []
+        for chunk in source:
+            chunks.append(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+        response_cache.put(key, b"".join(chunks), resp.mimetype)
+
+    resp.response = tee()
@@ -0,0 +1,137 @@
+# ======================================================
+# CATÁLOGOS EN MEMORIA
+# ======================================================
+# Tablas pequeñas que casi no cambian y que se leían en cada petición. Se cargan
+# una vez por proceso y las rutas que las modifican actualizan (o invalidan) la
+# copia en memoria.
+import hashlib
+import threading
+
+from database import get_pool_connection
+
+
+class PortfolioNames:
+    """
+    Nombres de portafolio por ID. Se carga completa la primera vez que se
+    necesita; create_portfolio la mantiene al día con set(). Un ID que no está
+    en memoria se busca en la base (lo pudo crear otro proceso), y all()
+    siempre relee la tabla.
+    """
+
+    def __init__(self, connect=get_pool_connection):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._names = None
+
+    def get(self, portfolio_id, default=None):
+        if portfolio_id is None:
+            return default
+        portfolio_id = int(portfolio_id)
+        name = self._load().get(portfolio_id)
+        if name is None:
+            row = self._query("SELECT name FROM portfolios WHERE id = ?", (portfolio_id,))
+            if not row:
+                return default
+            name = row[0]['name']
+            self.set(portfolio_id, name)
+        return name
+
+    def all(self):
+        """Copia {id: nombre} de todos los portafolios, leída de la base."""
+        names = {row['id']: row['name'] for row in self._query("SELECT id, name FROM portfolios")}
+        with self._lock:
+            self._names = names
+        return dict(names)
+
+    def set(self, portfolio_id, name):
+        with self._lock:
+            if self._names is not None:
+                self._names[int(portfolio_id)] = name
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+
+    def _load(self):
+        with self._lock:
+            if self._names is None:
+                self._names = {row['id']: row['name']
+                               for row in self._query("SELECT id, name FROM portfolios")}
+            return self._names
+
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+portfolio_names = PortfolioNames()
+
+
+class Catalogs:
+    """
+    Copia inmutable de classes, subclasses y statuses (listas de dict en orden
+    de ID) con índices por ID y las subclases agrupadas por clase.
+    """
+
+    def __init__(self, classes, subclasses, statuses):
+        self.classes = classes
+        self.subclasses = subclasses
+        self.statuses = statuses
+        # Huella del contenido: sirve de ETag aunque el proceso se reinicie
+        self.digest = hashlib.sha1(repr((classes, subclasses, statuses)).encode()).hexdigest()[:16]
+        self.class_by_id = {c['id']: c for c in classes}
+        self.subclass_by_id = {s['id']: s for s in subclasses}
+        self.status_by_id = {s['id']: s for s in statuses}
+        self.subclasses_by_class = {}
+        for sub in subclasses:
+            self.subclasses_by_class.setdefault(sub['class_id'], []).append(sub)
+
+    def subclasses_of(self, class_id):
+        return self.subclasses_by_class.get(class_id, [])
+
+    def etag(self, *parts):
+        """ETag de una respuesta derivada de esta copia (p.ej. subclases de una clase)."""
+        return "-".join([self.digest] + [str(p) for p in parts])
+
+
+class CatalogRegistry:
+    """
+    Registro en memoria de los catálogos. get() devuelve la copia vigente y la
+    carga (3 consultas) sólo si no existe; las rutas que crean, editan o borran
+    catálogos llaman a invalidate().
+    """
+
+    def __init__(self, connect=get_pool_connection):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._current = None
+        self.loads = 0
+
+    def get(self):
+        current = self._current
+        if current is not None:
+            return current
+        with self._lock:
+            if self._current is None:
+                self._current = self._load()
+            return self._current
+
+    def invalidate(self):
+        with self._lock:
+            self._current = None
+
+    def _load(self):
+        conn = self._connect()
+        try:
+            tables = [[dict(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY id")]
+                      for table in ('classes', 'subclasses', 'statuses')]
+        finally:
+            conn.close()
+        self.loads += 1
+        return Catalogs(*tables)
+
+
+registry = CatalogRegistry()
@@ -0,0 +1,106 @@
+# ======================================================
+# SERIES DE TIEMPO POR ACTIVO PARA GRÁFICAS
+# ======================================================
+# Series mensuales de uno o varios activos, con el monto original y los
+# valores normalizados en USD y MXN (fx.add_normalized_columns sobre todas las
+# filas a la vez). Un solo query con la lista de activos en JSON (json_each) y
+# el rango de meses opcional.
+#
+# Para historias largas se puede pedir un máximo de puntos: se reduce cada
+# serie con LTTB (Largest-Triangle-Three-Buckets), que conserva la forma de la
+# curva (picos y caídas) mejor que tomar un punto cada N. Los índices se
+# eligen sobre la serie en USD y se aplican a todas las columnas, así USD, MXN
+# y el monto original siguen alineados mes a mes.
+import json
+
+import numpy as np
+import pandas as pd
+
+import fx
+import metrics
+
+MAX_ASSETS = 200
+
+SERIES_SQL = """
+    SELECT av.asset_id,
+           a.name AS asset_name,
+           av.month,
+           av.amount,
+           av.currency
+      FROM asset_values av
+      JOIN assets a ON a.id = av.asset_id
+     WHERE a.portfolio_id = :pid
+       AND av.asset_id IN (SELECT value FROM json_each(:ids))
+       AND (:start IS NULL OR av.month >= :start)
+       AND (:end IS NULL OR av.month <= :end)
+     ORDER BY av.asset_id, av.month
+"""
+
+
+def lttb_indices(y, threshold, x=None):
+    """
+    Índices de los `threshold` puntos que LTTB conserva de la serie `y`
+    (siempre el primero y el último). Si la serie ya es corta, todos.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    # threshold - 2 cubetas con los puntos intermedios
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x = x[hi:edges[i + 2]].mean()
+            avg_y = y[hi:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        # Área del triángulo (punto elegido anterior, candidato, promedio de la siguiente cubeta)
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        selected[i + 1] = a
+    return selected
+
+
+def _round(values, digits=2):
+    return [round(float(v), digits) if np.isfinite(v) else None for v in values]
+
+
+def asset_series(conn, portfolio_id, asset_ids, start=None, end=None, points=None, rates=None):
+    """
+    Series de los activos del portafolio: lista de dicts id, name, months,
+    amount, currency, usd, mxn y total_points (meses antes de reducir).
+    Los activos sin valores en el rango (o de otro portafolio) no aparecen.
+    """
+    params = {'pid': portfolio_id, 'ids': json.dumps([int(i) for i in asset_ids]),
+              'start': start, 'end': end}
+    df = pd.read_sql_query(SERIES_SQL, conn, params=params)
+    if df.empty:
+        return []
+    if rates is None:
+        rates = fx.rate_cache.snapshot()
+    with metrics.timer('pandas'):
+        df = fx.add_normalized_columns(df, rates)
+        ordinal = df['month'].str[:4].astype(int) * 12 + df['month'].str[5:7].astype(int)
+        result = []
+        for asset_id, group in df.groupby('asset_id', sort=False):
+            idx = np.arange(len(group))
+            if points:
+                idx = lttb_indices(group['usd_value'].to_numpy(), points,
+                                   ordinal.loc[group.index].to_numpy())
+            rows = group.iloc[idx]
+            result.append({
+                'id': int(asset_id),
+                'name': group['asset_name'].iat[0],
+                'months': rows['month'].tolist(),
+                'amount': _round(rows['amount'].to_numpy()),
+                'currency': rows['currency'].tolist(),
+                'usd': _round(rows['usd_value'].to_numpy()),
+                'mxn': _round(rows['mxn_value'].to_numpy()),
+                'total_points': len(group),
+            })
+    return result
@@ -0,0 +1,127 @@
+# ======================================================
+# VISTA CONSOLIDADA DE VARIOS PORTAFOLIOS
+# ======================================================
+# Totales por clase y por moneda, mes a mes, sumando los portafolios elegidos.
+#
+# Cada portafolio aporta un "parcial": sus montos agrupados por (clase, mes,
+# moneda) ya convertidos a USD y MXN. Los parciales se guardan en memoria por
+# (portafolio, versión de datos), así que al cambiar un portafolio sólo se
+# recalcula el suyo. Los parciales que faltan se leen con un solo SELECT
+# agrupado para todos esos portafolios o, con workers > 1, uno por portafolio
+# en un pool de hilos (cada hilo con su propia conexión del pool). Después se
+# combinan en una sola pasada de pandas (concat + groupby).
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+import pandas as pd
+
+import cache
+import database
+import fx
+import metrics
+
+CURRENCIES = ('USD', 'MXN')
+
+PARTIAL_SQL = """
+    SELECT a.portfolio_id,
+           COALESCE(c.name, 'Sin clase') AS class,
+           av.month,
+           av.currency,
+           SUM(av.amount)                AS amount
+      FROM asset_values av
+      JOIN assets a       ON a.id = av.asset_id
+      LEFT JOIN classes c ON c.id = a.class_id
+     WHERE a.portfolio_id IN (SELECT value FROM json_each(?))
+     GROUP BY 1, 2, 3, 4
+"""
+
+PARTIAL_COLUMNS = ['portfolio_id', 'class', 'month', 'currency', 'amount', 'usd_value', 'mxn_value']
+
+_partials = cache.Memo(maxsize=128)
+
+
+def load_partials(conn, portfolio_ids, rates):
+    """{portafolio: DataFrame parcial} leídos con un solo SELECT agrupado."""
+    df = pd.read_sql_query(PARTIAL_SQL, conn, params=(json.dumps(list(portfolio_ids)),))
+    df = fx.add_normalized_columns(df, rates)[PARTIAL_COLUMNS]
+    groups = dict(tuple(df.groupby('portfolio_id')))
+    return {pid: groups.get(pid, df.iloc[0:0]).reset_index(drop=True) for pid in portfolio_ids}
+
+
+def _load_one(portfolio_id, rates):
+    # Fuera de la petición: conexión propia del pool, que regresa al cerrarse
+    conn = database.get_pool_connection()
+    try:
+        return load_partials(conn, [portfolio_id], rates)
+    finally:
+        conn.close()
+
+
+def partials(conn, portfolio_ids, workers=1, rates=None):
+    """Parciales de los portafolios: de la memoria o calculados sólo los que faltan."""
+    versions = cache.data_versions(conn, portfolio_ids)
+    found, missing = {}, []
+    for pid in portfolio_ids:
+        hit = _partials.get((pid, versions[pid]))
+        if hit is None:
+            missing.append(pid)
+        else:
+            found[pid] = hit
+    if missing:
+        if rates is None:
+            rates = fx.rate_cache.snapshot()
+        if workers > 1 and len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+                loaded = {}
+                for result in pool.map(lambda pid: _load_one(pid, rates), missing):
+                    loaded.update(result)
+        else:
+            loaded = load_partials(conn, missing, rates)
+        for pid, df in loaded.items():
+            _partials.put((pid, versions[pid]), df)
+        found.update(loaded)
+    return found
+
+
+def consolidate(frames, currency='USD', start=None, end=None):
+    """
+    Combina los parciales. Devuelve {'months', 'classes', 'by_class',
+    'by_currency', 'by_portfolio', 'totals'} con los meses en orden descendente.
+    """
+    value = 'usd_value' if currency == 'USD' else 'mxn_value'
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=PARTIAL_COLUMNS)
+    if start:
+        df = df[df['month'] >= start]
+    if end:
+        df = df[df['month'] <= end]
+    with metrics.timer('pandas'):
+        by_class = df.pivot_table(index='month', columns='class', values=value,
+                                  aggfunc='sum', fill_value=0.0).sort_index(ascending=False)
+        by_currency = df.pivot_table(index='month', columns='currency', values='amount',
+                                     aggfunc='sum', fill_value=0.0).reindex(by_class.index)
+        by_portfolio = df.pivot_table(index='month', columns='portfolio_id', values=value,
+                                      aggfunc='sum', fill_value=0.0).reindex(by_class.index)
+        totals = by_class.sum(axis=1)
+    return {
+        'currency': currency,
+        'months': list(by_class.index),
+        'classes': list(by_class.columns),
+        'by_class': by_class.round(2).to_dict('index'),
+        'by_currency': by_currency.fillna(0.0).round(2).to_dict('index'),
+        'by_portfolio': {month: {int(pid): v for pid, v in row.items()}
+                         for month, row in by_portfolio.fillna(0.0).round(2).to_dict('index').items()},
+        'totals': totals.round(2).to_dict(),
+    }
+
+
+def report(conn, portfolio_ids, currency='USD', start=None, end=None, workers=1):
+    """Vista consolidada de `portfolio_ids` en `currency` (USD o MXN)."""
+    if currency not in CURRENCIES:
+        raise ValueError(f"Moneda inválida: {currency!r}")
+    found = partials(conn, sorted(set(portfolio_ids)), workers)
+    frames = [df for df in found.values() if not df.empty]
+    return consolidate(frames, currency, start, end)
+
+
+def memo_stats():
+    return _partials.stats()
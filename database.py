@@ -1,39 +1,309 @@
+import queue
 import sqlite3
+import threading
+import time
+
+from flask import g, has_app_context
 
 db_path = "assets.db"  # Define el nombre de tu base de datos
 
+# Conexiones inactivas que el pool conserva abiertas para reutilizar.
+# Se puede ajustar por aplicación con app.config['DB_POOL_SIZE'].
+POOL_SIZE = 5
+
+# Perfil de PRAGMA aplicado una vez al abrir cada conexión física. WAL permite
+# que las lecturas largas (p.ej. el histórico con pandas) no bloqueen al único
+# escritor, ni el escritor a los lectores. Ajustable con app.config['DB_PRAGMAS'].
+PRAGMAS = {
+    'busy_timeout': 20000,        # ms de espera ante un bloqueo antes de fallar
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',      # seguro con WAL; sólo el último commit puede perderse ante un corte de luz
+    'cache_size': -16000,         # negativo = KiB (~16 MB por conexión)
+    'mmap_size': 268435456,       # 256 MB de lectura mapeada en memoria
+    'temp_store': 'MEMORY',
+    'wal_autocheckpoint': 1000,   # páginas del WAL antes del checkpoint automático
+    'foreign_keys': 'ON',         # Habilitar integridad referencial en cada nueva conexión
+}
+
+# Política de checkpoint: además del automático de SQLite, al terminar una
+# petición se hace un checkpoint PASSIVE si pasaron más de estos segundos desde
+# el último (0 lo desactiva). Ajustable con app.config['DB_CHECKPOINT_INTERVAL'].
+CHECKPOINT_INTERVAL = 300
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor que reporta a connection._sql_timer(sql, segundos) el tiempo de
+    ejecutar cada sentencia y de leer sus filas. Sólo se usa mientras la
+    conexión está instrumentada (ver instrument).
+    """
+    _sql = None
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            timer = self.connection._sql_timer
+            if timer is not None:
+                timer(self._sql, time.perf_counter() - start)
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def __next__(self):
+        return self._timed(super().__next__)
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Conexión SQLite que, al cerrarse, vuelve al pool en lugar de cerrarse.
+
+    Si está ligada a la petición actual (flask.g), close() sólo descarta la
+    transacción pendiente: la conexión se sigue reutilizando durante la
+    petición y se devuelve al pool en el teardown.
+    """
+    _pool = None
+    _request_bound = False
+    _sql_timer = None
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = TimedCursor if self._sql_timer is not None else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        if self._sql_timer is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._sql_timer is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self._request_bound:
+            if self.in_transaction:
+                self.rollback()
+        elif self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones a un archivo SQLite. Las PRAGMA se aplican una sola vez
+    al abrir cada conexión física; `size` acota cuántas quedan inactivas.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.reused += 1
+        except queue.Empty:
+            conn = self._connect()
+            with self._lock:
+                self.created += 1
+        conn._pool = self
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn._pool = None
+            sqlite3.Connection.close(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn._pool = None
+            sqlite3.Connection.close(conn)
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'created': self.created,
+            'reused': self.reused,
+        }
+
+    def _connect(self):
+        # check_same_thread=False: la conexión puede atender peticiones de distintos
+        # hilos, pero nunca de dos a la vez (sale del pool mientras se usa).
+        conn = sqlite3.connect(self.path, timeout=20, check_same_thread=False,
+                               factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn)
+        return conn
+
+
+def apply_pragmas(conn, pragmas=None):
+    """Aplica el perfil de PRAGMA (por defecto PRAGMAS) a una conexión."""
+    for name, value in (pragmas or PRAGMAS).items():
+        conn.execute(f"PRAGMA {name} = {value};")
+
+
+def effective_pragmas(conn=None):
+    """
+    Valores que SQLite reporta realmente para cada PRAGMA del perfil
+    (p.ej. journal_mode puede quedar en 'memory' para bases en memoria).
+    """
+    own = conn is None
+    if own:
+        conn = get_db_connection()
+    try:
+        return {name: conn.execute(f"PRAGMA {name};").fetchone()[0] for name in PRAGMAS}
+    finally:
+        if own:
+            conn.close()
+
+
+_last_checkpoint = time.monotonic()
+
+
+def checkpoint(conn=None, mode='PASSIVE'):
+    """
+    Ejecuta un checkpoint del WAL. Devuelve (busy, páginas en el log, páginas copiadas).
+    PASSIVE nunca espera a lectores ni escritores; TRUNCATE además vacía el archivo -wal.
+    """
+    global _last_checkpoint
+    own = conn is None
+    if own:
+        conn = get_db_connection()
+    try:
+        row = conn.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+    finally:
+        if own:
+            conn.close()
+    _last_checkpoint = time.monotonic()
+    return tuple(row)
+
+
+def maybe_checkpoint(conn):
+    """Checkpoint PASSIVE si venció CHECKPOINT_INTERVAL."""
+    if CHECKPOINT_INTERVAL and time.monotonic() - _last_checkpoint >= CHECKPOINT_INTERVAL:
+        checkpoint(conn)
+
+
+def instrument(conn, on_statement=None, on_timing=None):
+    """
+    Instrumenta una conexión: on_statement(sql) se registra como trace callback
+    de SQLite (se llama por cada sentencia que SQLite ejecuta, incluidas las de
+    los triggers) y on_timing(sql, segundos) recibe el tiempo de cada ejecución
+    y lectura de filas. Sin argumentos la deja sin instrumentar.
+    """
+    conn.set_trace_callback(on_statement)
+    conn._sql_timer = on_timing
+
+
+# Función opcional llamada con cada conexión que se liga a una petición
+# (la usa metrics.py para instrumentarla); ver set_request_hook.
+_request_hook = None
+
+
+def set_request_hook(hook):
+    global _request_hook
+    _request_hook = hook
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool de la base actual; se recrea si cambia db_path o el tamaño."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != db_path or _pool.size != POOL_SIZE:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(db_path, POOL_SIZE)
+        return _pool
+
+
 def get_db_connection():
-    conn = sqlite3.connect(db_path, timeout=20)  # Usa db_path aquí y agrega timeout opcionalmente
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")  # Habilitar integridad referencial en cada nueva conexión
-    return conn
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Crear la tabla de activos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS assets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            asset_name TEXT NOT NULL,
-            location TEXT,
-            amount REAL NOT NULL,
-            currency TEXT NOT NULL,
-            month TEXT,
-            clase TEXT,
-            fecha_ingreso TEXT
-        )
-    ''')
-    # Crear la tabla de tipo de cambio global
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS exchange_rate (
-            month TEXT PRIMARY KEY,
-            rate REAL NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    """
+    Dentro de una petición Flask devuelve siempre la misma conexión (guardada en
+    flask.g); fuera de ella, una conexión del pool que regresa al cerrarse.
+    """
+    if has_app_context():
+        if 'db' not in g:
+            conn = get_pool().acquire()
+            conn._request_bound = True
+            g.db = conn
+            if _request_hook is not None:
+                _request_hook(conn)
+        return g.db
+    return get_pool().acquire()
+
+
+def get_pool_connection():
+    """
+    Conexión propia del pool, nunca la de la petición: para las cachés en
+    memoria que leen la base por su cuenta. Al cerrarla regresa al pool sin
+    tocar la transacción que la petición tenga abierta en flask.g.
+    """
+    return get_pool().acquire()
+
+
+def close_db(exc=None):
+    """Teardown: devuelve al pool la conexión de la petición."""
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn._request_bound = False
+        if conn.in_transaction:
+            conn.rollback()
+        maybe_checkpoint(conn)
+        if conn._sql_timer is not None:
+            instrument(conn)
+        conn.close()
+
+
+def init_app(app):
+    """
+    Registra el teardown y toma de app.config el tamaño del pool (DB_POOL_SIZE),
+    el perfil de PRAGMA (DB_PRAGMAS) y la política de checkpoint (DB_CHECKPOINT_INTERVAL).
+    """
+    global POOL_SIZE, CHECKPOINT_INTERVAL
+    POOL_SIZE = app.config.setdefault('DB_POOL_SIZE', POOL_SIZE)
+    PRAGMAS.update(app.config.setdefault('DB_PRAGMAS', {}))
+    CHECKPOINT_INTERVAL = app.config.setdefault('DB_CHECKPOINT_INTERVAL', CHECKPOINT_INTERVAL)
+    app.teardown_appcontext(close_db)
+
 
 if __name__ == '__main__':
-    init_db()
-    print("Base de datos inicializada correctamente.")
-    
\ No newline at end of file
+    # Muestra la configuración efectiva de la base: python database.py
+    for name, value in effective_pragmas().items():
+        print(f"{name:20} {value}")
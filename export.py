@@ -0,0 +1,155 @@
+# ======================================================
+# EXPORTACIÓN DEL HISTÓRICO (CSV / Parquet / Arrow)
+# ======================================================
+# Exporta el histórico del portafolio como tabla plana: assets x asset_values
+# con los nombres de catálogo y el tipo de cambio del mes. Se lee por bloques
+# (pandas chunksize, que usa fetchmany) y cada bloque se escribe y se descarta,
+# así la memoria no depende del tamaño del portafolio.
+#
+# - csv:     se envía en streaming, bloque por bloque.
+# - arrow:   formato Arrow IPC (stream), también bloque por bloque.
+# - parquet: un row group por bloque en un archivo temporal, que luego se
+#            envía (Parquet escribe su índice al final del archivo).
+# Arrow y Parquet requieren pyarrow (opcional: pip install pyarrow).
+#
+# Con normalized=True se agregan las columnas rate, usd_value y mxn_value,
+# calculadas con fx.add_normalized_columns sobre cada bloque.
+import io
+import tempfile
+
+import pandas as pd
+
+import fx
+
+CHUNK_SIZE = 20000
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+EXPORT_SQL = """
+    SELECT a.portfolio_id,
+           a.id             AS asset_id,
+           a.name           AS asset_name,
+           a.location,
+           a.date_acquired,
+           c.name           AS class,
+           sc.name          AS subclass,
+           st.name          AS status,
+           av.month,
+           av.amount,
+           av.currency,
+           er.rate          AS exchange_rate
+      FROM asset_values av
+      JOIN assets a          ON a.id  = av.asset_id
+      LEFT JOIN classes c    ON c.id  = a.class_id
+      LEFT JOIN subclasses sc ON sc.id = a.subclass_id
+      LEFT JOIN statuses st  ON st.id = av.status_id
+      LEFT JOIN exchange_rate er ON er.month = av.month
+     WHERE a.portfolio_id = :pid
+       AND (:start IS NULL OR av.month >= :start)
+       AND (:end IS NULL OR av.month <= :end)
+     ORDER BY av.month, a.name
+"""
+
+# Tipos de cada columna (los bloques sin valores en una columna no deben
+# cambiar el esquema del archivo).
+COLUMN_TYPES = {
+    'portfolio_id': 'int64', 'asset_id': 'int64', 'asset_name': 'string',
+    'location': 'string', 'date_acquired': 'string', 'class': 'string',
+    'subclass': 'string', 'status': 'string', 'month': 'string',
+    'amount': 'float64', 'currency': 'string', 'exchange_rate': 'float64',
+}
+NORMALIZED_TYPES = {'rate': 'float64', 'usd_value': 'float64', 'mxn_value': 'float64'}
+
+
+def check_format(fmt):
+    """ValueError si el formato no existe; RuntimeError si requiere pyarrow y no está instalado."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconocido: {fmt!r} (use {', '.join(FORMATS)})")
+    if fmt != 'csv':
+        _pyarrow('parquet' if fmt == 'parquet' else None)
+
+
+def iter_frames(conn, portfolio_id, start=None, end=None, normalized=False, chunksize=CHUNK_SIZE):
+    """Genera DataFrames de hasta `chunksize` filas con el histórico del portafolio."""
+    rates = fx.rate_cache.snapshot() if normalized else None
+    params = {'pid': portfolio_id, 'start': start, 'end': end}
+    for df in pd.read_sql_query(EXPORT_SQL, conn, params=params, chunksize=chunksize):
+        if normalized:
+            df = fx.add_normalized_columns(df, rates)
+        yield df
+
+
+def csv_chunks(frames, normalized=False):
+    """Texto CSV por bloque; el encabezado sólo va en el primero (y sale aunque no haya filas)."""
+    header = True
+    for df in frames:
+        yield df.to_csv(index=False, header=header)
+        header = False
+    if header:
+        columns = list(COLUMN_TYPES) + (list(NORMALIZED_TYPES) if normalized else [])
+        yield pd.DataFrame(columns=columns).to_csv(index=False)
+
+
+def _arrow_schema(normalized):
+    pa = _pyarrow()
+    types = dict(COLUMN_TYPES, **(NORMALIZED_TYPES if normalized else {}))
+    mapping = {'int64': pa.int64(), 'float64': pa.float64(), 'string': pa.string()}
+    return pa.schema([(name, mapping[t]) for name, t in types.items()])
+
+
+def _arrow_table(df, schema):
+    pa = _pyarrow()
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+def arrow_chunks(frames, normalized=False):
+    """Bytes de un stream Arrow IPC: esquema y luego un lote por bloque."""
+    pa = _pyarrow()
+    schema = _arrow_schema(normalized)
+    buf = io.BytesIO()
+    writer = pa.ipc.new_stream(buf, schema)
+
+    def drain():
+        # El formato stream no vuelve atrás: lo escrito se envía y se descarta
+        data = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return data
+
+    yield drain()
+    for df in frames:
+        writer.write_table(_arrow_table(df, schema))
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+def parquet_file(frames, normalized=False):
+    """
+    Escribe los bloques como row groups de un Parquet en un archivo temporal
+    y lo devuelve abierto y posicionado al inicio (se borra al cerrarlo).
+    """
+    pq = _pyarrow('parquet')
+    schema = _arrow_schema(normalized)
+    tmp = tempfile.TemporaryFile()
+    with pq.ParquetWriter(tmp, schema, compression='zstd') as writer:
+        for df in frames:
+            writer.write_table(_arrow_table(df, schema))
+    tmp.seek(0)
+    return tmp
+
+
+def _pyarrow(module=None):
+    try:
+        import pyarrow
+        if module == 'parquet':
+            import pyarrow.parquet
+            return pyarrow.parquet
+        import pyarrow.ipc  # noqa: F401
+        return pyarrow
+    except ImportError:
+        raise RuntimeError("Para exportar en Parquet o Arrow instala pyarrow (pip install pyarrow).")
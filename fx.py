@@ -0,0 +1,188 @@
+# ======================================================
+# CONVERSIÓN DE DIVISAS (USD <-> MXN) VECTORIZADA
+# ======================================================
+# El tipo de cambio se expresa en pesos por 1 dólar y se guarda por mes en la
+# tabla exchange_rate. En lugar de consultar la tabla fila por fila, se carga
+# completa una sola vez y se cruza por mes contra columnas enteras de pandas.
+# Las búsquedas puntuales (get_exchange_rate) se sirven desde `rate_cache`, una
+# caché en memoria que se actualiza al escribir en la tabla.
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from database import get_pool_connection
+
+# Tipo de cambio que se usa cuando el mes no tiene tasa registrada (o es 0).
+DEFAULT_RATE = 1.0
+# Número máximo de meses que guarda la caché LRU (más de 80 años).
+RATE_CACHE_SIZE = 1024
+
+
+def load_rates(conn):
+    """
+    Carga la tabla exchange_rate completa en una Serie indexada por mes.
+    """
+    rows = conn.execute("SELECT month, rate FROM exchange_rate").fetchall()
+    return pd.Series({row['month']: row['rate'] for row in rows}, dtype=float, name='rate')
+
+
+def rates_for(months, rates):
+    """
+    Devuelve el tipo de cambio efectivo para cada mes de `months` (Serie).
+    Los meses sin tasa, con tasa nula o en cero usan DEFAULT_RATE.
+    """
+    rate = months.astype(str).str.strip().map(rates).astype(float)
+    rate = rate.fillna(DEFAULT_RATE)
+    return rate.where(rate != 0, DEFAULT_RATE)
+
+
+def known_rate(rates, month):
+    """
+    Tipo de cambio registrado para el mes, o None si no existe, es nulo o es 0
+    (a diferencia de rates_for, no cae a DEFAULT_RATE).
+    """
+    rate = rates.get(month)
+    if rate is None or pd.isna(rate) or rate == 0:
+        return None
+    return float(rate)
+
+
+def to_mxn(amount, currency, rate):
+    """
+    Convierte montos a pesos: todo lo que no es MXN (incluida la moneda
+    vacía) se multiplica por el tipo de cambio, como hacía la vista histórica.
+    Acepta escalares o columnas completas.
+    """
+    return np.where(currency != 'MXN', amount * rate, amount)
+
+
+def to_usd(amount, currency, rate):
+    """
+    Convierte montos a dólares: todo lo que no es USD (incluida la moneda
+    vacía) se divide entre el tipo de cambio, como hacía la vista histórica.
+    Acepta escalares o columnas completas.
+    """
+    return np.where(currency != 'USD', amount / rate, amount)
+
+
+def add_normalized_columns(df, rates):
+    """
+    Agrega a `df` (columnas month, amount, currency) las columnas `rate`,
+    `usd_value` y `mxn_value` en una sola pasada vectorizada.
+    """
+    df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
+    df['rate'] = rates_for(df['month'], rates)
+    df['usd_value'] = to_usd(df['amount'], df['currency'], df['rate'])
+    df['mxn_value'] = to_mxn(df['amount'], df['currency'], df['rate'])
+    return df
+
+
+# ======================================================
+# CACHÉ EN MEMORIA DE TIPOS DE CAMBIO
+# ======================================================
+class RateCache:
+    """
+    Caché mes -> tipo de cambio, segura entre hilos y acotada por LRU.
+
+    La primera consulta carga en bloque los meses más recientes de la tabla;
+    los meses ausentes se consultan una sola vez y se recuerdan (con
+    DEFAULT_RATE si no existen). Toda escritura a exchange_rate debe pasar
+    por `set` (o `invalidate`) para que la caché nunca quede desfasada.
+    """
+
+    def __init__(self, connect=get_pool_connection, maxsize=RATE_CACHE_SIZE):
+        self._connect = connect
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._rates = OrderedDict()
+        self._loaded = False
+        self._snapshot = None
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, month):
+        """Tipo de cambio del mes; DEFAULT_RATE si no está registrado."""
+        month = month.strip()
+        with self._lock:
+            if not self._loaded:
+                self._load_recent()
+            if month in self._rates:
+                self._rates.move_to_end(month)
+                self.hits += 1
+                return self._rates[month]
+            self.misses += 1
+            conn = self._connect()
+            row = conn.execute('SELECT rate FROM exchange_rate WHERE month = ?', (month,)).fetchone()
+            conn.close()
+            rate = row['rate'] if row else DEFAULT_RATE
+            self._put(month, rate)
+            return rate
+
+    def snapshot(self):
+        """
+        Serie con la tabla exchange_rate completa, para conversiones vectorizadas
+        (ver add_normalized_columns). Se recarga sólo cuando cambia la generación.
+        """
+        with self._lock:
+            if self._snapshot is None:
+                conn = self._connect()
+                self._snapshot = load_rates(conn)
+                conn.close()
+            return self._snapshot
+
+    def set(self, month, rate):
+        """Escritura directa (write-through) tras guardar un tipo de cambio."""
+        with self._lock:
+            self._put(month.strip(), rate)
+            self._snapshot = None
+            self.generation += 1
+
+    def expire_snapshot(self):
+        """
+        Descarta la serie completa tras el commit de un tipo de cambio: si otra
+        petición la recargó entre `set` y el commit, leyó la tasa anterior.
+        """
+        with self._lock:
+            self._snapshot = None
+            self.generation += 1
+
+    def invalidate(self):
+        """Descarta todo; la siguiente consulta vuelve a cargar desde la base."""
+        with self._lock:
+            self._rates.clear()
+            self._loaded = False
+            self._snapshot = None
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._rates),
+                'maxsize': self.maxsize,
+                'generation': self.generation,
+            }
+
+    def _load_recent(self):
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT month, rate FROM exchange_rate ORDER BY month DESC LIMIT ?',
+            (self.maxsize,)
+        ).fetchall()
+        conn.close()
+        for row in reversed(rows):
+            self._rates[row['month']] = row['rate']
+        self._loaded = True
+
+    def _put(self, month, rate):
+        self._rates[month] = rate
+        self._rates.move_to_end(month)
+        while len(self._rates) > self.maxsize:
+            self._rates.popitem(last=False)
+
+
+rate_cache = RateCache()
@@ -0,0 +1,70 @@
+# ======================================================
+# HISTÓRICO DE ACTIVOS: datos de la tabla pivote
+# ======================================================
+# Construye, en una sola pasada vectorizada, todo lo que pinta la plantilla
+# assets_history.html: la matriz activos x meses en USD, el tipo de cambio por
+# mes, los totales USD/MXN y sus variaciones porcentuales. La plantilla sólo
+# recorre listas ya calculadas (sin accesos celda por celda a pandas).
+import numpy as np
+import pandas as pd
+
+import fx
+import metrics
+import summary
+
+HISTORY_SQL = """
+    SELECT
+      a.id,
+      a.name       AS asset_name,
+      av.month     AS month,
+      av.amount    AS amount,
+      av.currency  AS currency
+    FROM assets a
+    JOIN asset_values av
+      ON a.id = av.asset_id
+    WHERE a.portfolio_id = ?
+    ORDER BY av.month, a.name
+"""
+
+
+def pct_change(values):
+    """
+    Variación porcentual contra el mes anterior. El primer mes es None y, si el
+    mes anterior es 0, la variación es 0 (para no dividir entre cero).
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return []
+    prev, curr = values[:-1], values[1:]
+    pct = np.divide(curr - prev, prev, out=np.zeros_like(curr), where=prev != 0) * 100
+    return [None] + pct.tolist()
+
+
+def build(conn, portfolio_id, rates=None):
+    """
+    Datos del histórico del portafolio, o None si no tiene valores.
+    `grid` es una lista de filas (una por activo, en el orden de `assets`) con
+    el valor en USD de cada mes de `months`; NaN donde no hay valor.
+    """
+    df = pd.read_sql_query(HISTORY_SQL, conn, params=(portfolio_id,))
+    if df.empty:
+        return None
+    if rates is None:
+        rates = fx.rate_cache.snapshot()
+    with metrics.timer('pandas'):
+        df = fx.add_normalized_columns(df, rates)
+        months = sorted(df['month'].unique())
+        pivot = (df.pivot_table(index='asset_name', columns='month', values='usd_value', aggfunc='sum')
+                   .reindex(columns=months))
+    totals = summary.monthly_totals(conn, portfolio_id, rates).reindex(months).fillna(0)
+
+    return {
+        'months': months,
+        'rates': fx.rates_for(pd.Series(months), rates).tolist(),
+        'assets': pivot.index.tolist(),
+        'grid': pivot.to_numpy().tolist(),
+        'totals_usd': totals['usd_value'].tolist(),
+        'totals_mxn': totals['mxn_value'].tolist(),
+        'variation_usd': pct_change(totals['usd_value']),
+        'variation_mxn': pct_change(totals['mxn_value']),
+    }
@@ -0,0 +1,241 @@
+# ======================================================
+# IMPORTADOR MASIVO DE ACTIVOS (CSV / Excel)
+# ======================================================
+# Carga valores mensuales en el esquema assets + asset_values. El archivo se
+# lee por bloques (memoria constante), los nombres de clase, subclase, estatus
+# y activo se resuelven contra diccionarios precargados y cada bloque se
+# escribe con executemany en su propia transacción.
+#
+# Columnas reconocidas (encabezados):
+#   asset_name (obligatoria), amount (obligatoria), month, currency,
+#   class, subclass, status, location, date_acquired, observations
+# Si el archivo no trae columna `month`, cada fila se replica en todos los
+# meses del rango --start/--end (como el antiguo Seed_assets.py).
+#
+# Uso:
+#   python import_assets.py datos.csv --portfolio 1
+#   python import_assets.py datos.xlsx --portfolio 1 --start 2025-01 --end 2025-04
+import argparse
+import csv
+import datetime
+import time
+from itertools import islice
+
+from bulk_ops import CURRENCIES, MONTH_RE, month_range, parse_amount
+from cache import bump_data_version
+from catalogs import registry as catalog_registry
+from database import get_db_connection
+
+CHUNK_SIZE = 5000
+DEFAULT_CURRENCY = 'USD'
+DEFAULT_CLASS = 'Otros'
+DEFAULT_SUBCLASS = 'Otros'
+
+# Si la fila no trae estatus se conserva el del mes (como UPSERT_MONTH_VALUE).
+UPSERT_VALUE = """
+    INSERT INTO asset_values (asset_id, month, amount, currency, status_id)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(asset_id, month) DO UPDATE SET
+        amount    = excluded.amount,
+        currency  = excluded.currency,
+        status_id = COALESCE(excluded.status_id, asset_values.status_id)
+"""
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Genera listas de hasta `chunk_size` filas (dict) sin cargar el archivo completo."""
+    rows = _iter_excel(path) if path.lower().endswith(('.xlsx', '.xlsm')) else _iter_csv(path)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def _iter_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+
+def _iter_excel(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Para importar Excel instala openpyxl (pip install openpyxl).")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, [])]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+class Lookups:
+    """
+    Catálogos y activos del portafolio precargados en diccionarios nombre -> id.
+    Las entradas que no existen se crean al vuelo y se agregan al diccionario.
+    """
+
+    def __init__(self, conn, portfolio_id):
+        self.conn = conn
+        self.portfolio_id = portfolio_id
+        self.classes = {r['name']: r['id'] for r in conn.execute("SELECT id, name FROM classes")}
+        self.subclasses = {(r['class_id'], r['name']): r['id']
+                           for r in conn.execute("SELECT id, class_id, name FROM subclasses")}
+        self.statuses = {r['name']: r['id'] for r in conn.execute("SELECT id, name FROM statuses")}
+        self.assets = {}
+        for r in conn.execute("SELECT id, name FROM assets WHERE portfolio_id = ? ORDER BY id",
+                              (portfolio_id,)):
+            self.assets.setdefault(r['name'], r['id'])
+        self.created = {'classes': 0, 'subclasses': 0, 'statuses': 0, 'assets': 0}
+
+    def class_id(self, name):
+        name = name or DEFAULT_CLASS
+        if name not in self.classes:
+            self.classes[name] = self._insert('classes', "INSERT INTO classes (name) VALUES (?)", (name,))
+        return self.classes[name]
+
+    def subclass_id(self, class_id, name):
+        key = (class_id, name or DEFAULT_SUBCLASS)
+        if key not in self.subclasses:
+            self.subclasses[key] = self._insert(
+                'subclasses', "INSERT INTO subclasses (class_id, name) VALUES (?, ?)", key)
+        return self.subclasses[key]
+
+    def status_id(self, name):
+        if not name:
+            return None
+        if name not in self.statuses:
+            self.statuses[name] = self._insert('statuses', "INSERT INTO statuses (name) VALUES (?)", (name,))
+        return self.statuses[name]
+
+    def asset_id(self, row):
+        name = row['asset_name']
+        if name not in self.assets:
+            class_id = self.class_id(_text(row, 'class'))
+            self.assets[name] = self._insert('assets', """
+                INSERT INTO assets
+                    (name, location, date_acquired, class_id, subclass_id, portfolio_id, observations)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (name, _text(row, 'location'), _text(row, 'date_acquired'), class_id,
+                  self.subclass_id(class_id, _text(row, 'subclass')), self.portfolio_id,
+                  _text(row, 'observations')))
+        return self.assets[name]
+
+    def _insert(self, kind, sql, params):
+        self.created[kind] += 1
+        return self.conn.execute(sql, params).lastrowid
+
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _month(row):
+    """
+    Mes de la fila como AAAA-MM ('' si no trae). Excel entrega fechas como
+    datetime o como '2025-01-01 00:00:00'; se recortan al mes. Cualquier otro
+    formato es ValueError.
+    """
+    value = row.get('month')
+    if isinstance(value, datetime.date):
+        return value.strftime('%Y-%m')
+    month = _text(row, 'month')
+    if len(month) > 7 and month[7] == '-':
+        month = month[:7]
+    if month and not MONTH_RE.match(month):
+        raise ValueError(f"month inválido: {month!r} (se espera AAAA-MM)")
+    return month
+
+
+def _created_catalogs(lookups):
+    return sum(lookups.created[k] for k in ('classes', 'subclasses', 'statuses'))
+
+
+def import_file(path, portfolio_id, start=None, end=None, chunk_size=CHUNK_SIZE, conn=None):
+    """
+    Importa `path` al portafolio. Devuelve un resumen con filas leídas,
+    valores escritos, errores (primeros 20, con número de línea), entradas
+    creadas en catálogos y filas por segundo.
+    """
+    own = conn is None
+    if own:
+        conn = get_db_connection()
+    months = month_range(start, end) if start and end else None
+    lookups = Lookups(conn, portfolio_id)
+    stats = {'rows': 0, 'values': 0, 'errors': 0, 'error_samples': []}
+    began = time.perf_counter()
+    line = 1
+    try:
+        for chunk in read_chunks(path, chunk_size):
+            batch = []
+            created_before = _created_catalogs(lookups)
+            conn.execute("BEGIN")
+            try:
+                for row in chunk:
+                    line += 1
+                    stats['rows'] += 1
+                    try:
+                        row['asset_name'] = _text(row, 'asset_name')
+                        if not row['asset_name']:
+                            raise ValueError("asset_name vacío")
+                        amount = parse_amount(row.get('amount'))
+                        month = _month(row)
+                        row_months = [month] if month else months
+                        if not row_months:
+                            raise ValueError("sin columna month ni rango --start/--end")
+                        currency = _text(row, 'currency').upper() or DEFAULT_CURRENCY
+                        if currency not in CURRENCIES:
+                            raise ValueError(f"moneda inválida {currency!r}")
+                        asset_id = lookups.asset_id(row)
+                        status_id = lookups.status_id(_text(row, 'status'))
+                    except (ValueError, TypeError) as e:
+                        stats['errors'] += 1
+                        if len(stats['error_samples']) < 20:
+                            stats['error_samples'].append(f"línea {line}: {e}")
+                        continue
+                    batch.extend((asset_id, m, amount, currency, status_id) for m in row_months)
+                conn.executemany(UPSERT_VALUE, batch)
+                # Las versiones se incrementan en la misma transacción que los datos
+                if batch:
+                    bump_data_version(conn, portfolio_id)
+                if _created_catalogs(lookups) != created_before:
+                    bump_data_version(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            stats['values'] += len(batch)
+        if _created_catalogs(lookups):
+            catalog_registry.invalidate()
+    finally:
+        if own:
+            conn.close()
+    elapsed = time.perf_counter() - began
+    stats['created'] = lookups.created
+    stats['seconds'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['rows'] / elapsed) if elapsed else stats['rows']
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa valores mensuales de activos desde CSV o Excel.")
+    parser.add_argument('archivo')
+    parser.add_argument('--portfolio', type=int, required=True, help="ID del portafolio destino")
+    parser.add_argument('--start', help="Mes inicial AAAA-MM (si el archivo no trae columna month)")
+    parser.add_argument('--end', help="Mes final AAAA-MM (si el archivo no trae columna month)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    result = import_file(args.archivo, args.portfolio, args.start, args.end, args.chunk_size)
+    print(f"Importación completada: {result['rows']} filas, {result['values']} valores, "
+          f"{result['errors']} errores en {result['seconds']} s "
+          f"({result['rows_per_second']} filas/s).")
+    print(f"Creados: {result['created']}")
+    for msg in result['error_samples']:
+        print("  -", msg)
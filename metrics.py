@@ -0,0 +1,215 @@
+# ======================================================
+# INSTRUMENTACIÓN POR PETICIÓN (opcional)
+# ======================================================
+# Con app.config['METRICS_ENABLED'] (variable de entorno METRICS_ENABLED=1)
+# cada petición registra:
+#   - tiempo total de la ruta,
+#   - sentencias SQL ejecutadas (trace callback de SQLite), su tiempo total y
+#     la sentencia más lenta (ver database.instrument),
+#   - tiempo de render de Jinja (señales de Flask; las páginas enviadas en
+#     streaming lo cuentan dentro del tiempo total),
+#   - tiempo de cómputo con pandas (bloques marcados con `timer('pandas')`).
+# Los valores de la petición se envían en el encabezado Server-Timing y los
+# acumulados por ruta se publican en texto plano en /metrics.
+#
+# Desactivada no agrega hooks: timer() y timed() no hacen nada.
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial, wraps
+
+from flask import Response, before_render_template, g, has_app_context, request, template_rendered
+
+import database
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    """Mediciones de una sola petición (se guarda en flask.g.metrics)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.sql_by_statement = {}
+        self.sections = {}
+        self._depth = {}
+        self._template_started = None
+
+    # -- SQL (callbacks que recibe database.instrument) --
+    def on_statement(self, sql):
+        self.statements += 1
+
+    def on_sql_time(self, sql, seconds):
+        self.sql_seconds += seconds
+        self.sql_by_statement[sql] = self.sql_by_statement.get(sql, 0.0) + seconds
+
+    def slowest_sql(self):
+        """(sentencia, segundos acumulados) de la sentencia más costosa, o (None, 0)."""
+        if not self.sql_by_statement:
+            return None, 0.0
+        return max(self.sql_by_statement.items(), key=lambda item: item[1])
+
+    # -- secciones (template, pandas, ...) --
+    def enter(self, name):
+        depth = self._depth.get(name, 0)
+        self._depth[name] = depth + 1
+        # Sólo el bloque más externo cuenta (history.build llama a summary)
+        return time.perf_counter() if depth == 0 else None
+
+    def leave(self, name, started):
+        self._depth[name] -= 1
+        if started is not None:
+            self.sections[name] = self.sections.get(name, 0.0) + time.perf_counter() - started
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        _, sql_max = self.slowest_sql()
+        parts = [
+            f"app;dur={self.elapsed() * 1000:.1f}",
+            f'sql;dur={self.sql_seconds * 1000:.1f};desc="{self.statements} sentencias"',
+            f"sql-max;dur={sql_max * 1000:.1f}",
+        ]
+        parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.sections.items()]
+        return ", ".join(parts)
+
+
+class Registry:
+    """Acumulados por ruta para /metrics."""
+
+    FIELDS = ('requests', 'seconds', 'seconds_max', 'sql_statements', 'sql_seconds',
+              'sql_seconds_max', 'template_seconds', 'pandas_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_endpoint = {}
+
+    def record(self, endpoint, m):
+        elapsed = m.elapsed()
+        _, sql_max = m.slowest_sql()
+        with self._lock:
+            row = self.by_endpoint.setdefault(endpoint, dict.fromkeys(self.FIELDS, 0))
+            row['requests'] += 1
+            row['seconds'] += elapsed
+            row['seconds_max'] = max(row['seconds_max'], elapsed)
+            row['sql_statements'] += m.statements
+            row['sql_seconds'] += m.sql_seconds
+            row['sql_seconds_max'] = max(row['sql_seconds_max'], sql_max)
+            row['template_seconds'] += m.sections.get('template', 0.0)
+            row['pandas_seconds'] += m.sections.get('pandas', 0.0)
+
+    def reset(self):
+        with self._lock:
+            self.by_endpoint.clear()
+
+    def render(self, gauges=None):
+        """Formato de texto de Prometheus: portfolio_<campo>{endpoint="..."} valor."""
+        lines = []
+        with self._lock:
+            for field in self.FIELDS:
+                lines.append(f"# TYPE portfolio_{field} {'gauge' if field.endswith('_max') else 'counter'}")
+                for endpoint, row in sorted(self.by_endpoint.items()):
+                    lines.append(f'portfolio_{field}{{endpoint="{endpoint}"}} {row[field]:g}')
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE portfolio_{name} gauge")
+            lines.append(f"portfolio_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def current():
+    """Mediciones de la petición en curso, o None (fuera de petición o desactivado)."""
+    return g.get('metrics') if has_app_context() else None
+
+
+@contextmanager
+def timer(name):
+    """Suma al tiempo de la sección `name` de la petición actual lo que tarde el bloque."""
+    m = current()
+    if m is None:
+        yield
+        return
+    started = m.enter(name)
+    try:
+        yield
+    finally:
+        m.leave(name, started)
+
+
+def timed(name):
+    """Decorador equivalente a envolver la función en `with timer(name)`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# -- hooks de Flask --
+def _start():
+    g.metrics = RequestMetrics()
+
+
+def _instrument_connection(conn):
+    m = current()
+    if m is not None:
+        database.instrument(conn, m.on_statement, m.on_sql_time)
+
+
+def _add_header(response):
+    m = current()
+    if m is not None:
+        response.headers['Server-Timing'] = m.server_timing()
+        # Se registra al cerrar la respuesta: en streaming, al terminar el envío
+        response.call_on_close(partial(_record, m, request.endpoint or 'unknown',
+                                       request.method, request.path))
+    return response
+
+
+def _record(m, endpoint, method, path):
+    registry.record(endpoint, m)
+    sql_text, sql_max = m.slowest_sql()
+    logger.debug("%s %s: %.1f ms, %d sentencias SQL (%.1f ms); más lenta %.1f ms: %s",
+                 method, path, m.elapsed() * 1000, m.statements, m.sql_seconds * 1000,
+                 sql_max * 1000, ' '.join((sql_text or '').split())[:200])
+
+
+def _template_started(sender, template, context, **extra):
+    m = current()
+    if m is not None:
+        m._template_started = m.enter('template')
+
+
+def _template_done(sender, template, context, **extra):
+    m = current()
+    if m is not None and m._depth.get('template'):
+        m.leave('template', m._template_started)
+
+
+def init_app(app, gauges=None):
+    """
+    Activa la instrumentación si app.config['METRICS_ENABLED'] y registra
+    /metrics (como el resto de rutas, requiere sesión iniciada). `gauges` es
+    una función opcional que devuelve {nombre: valor} adicionales (caché,
+    pool de conexiones, ...) para /metrics.
+    """
+    if not app.config.setdefault('METRICS_ENABLED', False):
+        return
+    app.before_request_funcs.setdefault(None, []).insert(0, _start)
+    app.after_request(_add_header)
+    database.set_request_hook(_instrument_connection)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_done, app)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(gauges() if gauges else None),
+                        mimetype='text/plain; version=0.0.4')
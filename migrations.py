@@ -0,0 +1,320 @@
+# ======================================================
+# MIGRACIONES DE ESQUEMA VERSIONADAS
+# ======================================================
+# Cada migración es (versión, descripción, pasos). Un paso es una sentencia SQL
+# o una función que recibe la conexión. Las versiones aplicadas se registran en
+# la tabla schema_migrations, así una base existente se actualiza en su lugar
+# sin perder datos: sólo se ejecutan las migraciones pendientes, cada una en
+# su propia transacción.
+from datetime import datetime
+
+MIGRATIONS = [
+    (1, "Esquema base: catálogos, assets + asset_values, tipo de cambio y adjuntos", [
+        """
+        CREATE TABLE IF NOT EXISTS portfolios (
+            id   INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT    NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS classes (
+            id   INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT    NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS subclasses (
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL,
+            name     TEXT    NOT NULL,
+            UNIQUE(class_id, name),
+            FOREIGN KEY(class_id) REFERENCES classes(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS statuses (
+            id   INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT    NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS assets (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            name           TEXT    NOT NULL,
+            location       TEXT,
+            date_acquired  TEXT,            -- fecha_ingreso
+            class_id       INTEGER NOT NULL,
+            subclass_id    INTEGER NOT NULL,
+            portfolio_id   INTEGER NOT NULL,
+            observations   TEXT,            -- observaciones
+            FOREIGN KEY(class_id)     REFERENCES classes(id),
+            FOREIGN KEY(subclass_id)  REFERENCES subclasses(id),
+            FOREIGN KEY(portfolio_id) REFERENCES portfolios(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS asset_values (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            asset_id   INTEGER NOT NULL,
+            month      TEXT    NOT NULL,   -- p.ej. '2025-04'
+            amount     REAL,
+            currency   TEXT,
+            status_id  INTEGER,             -- vincula a statuses(id)
+            UNIQUE(asset_id, month),
+            FOREIGN KEY(asset_id)  REFERENCES assets(id)  ON DELETE CASCADE,
+            FOREIGN KEY(status_id) REFERENCES statuses(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS exchange_rate (
+            month TEXT PRIMARY KEY,
+            rate  REAL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS attachments (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            asset_id     INTEGER NOT NULL,
+            filename     TEXT    NOT NULL,
+            path         TEXT    NOT NULL,
+            upload_date  TEXT    DEFAULT (datetime('now')),
+            FOREIGN KEY(asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (2, "Índices para los filtros por portafolio, mes y catálogos", [
+        # Listado / copia / histórico: WHERE a.portfolio_id = ? ORDER BY a.name
+        "CREATE INDEX IF NOT EXISTS idx_assets_portfolio_name ON assets(portfolio_id, name)",
+        "CREATE INDEX IF NOT EXISTS idx_assets_class ON assets(class_id)",
+        "CREATE INDEX IF NOT EXISTS idx_assets_subclass ON assets(subclass_id)",
+        # WHERE av.month = ?: cubre además las columnas que se leen, sin ir a la tabla
+        """CREATE INDEX IF NOT EXISTS idx_asset_values_month_asset
+           ON asset_values(month, asset_id, amount, currency, status_id)""",
+        "CREATE INDEX IF NOT EXISTS idx_attachments_asset ON attachments(asset_id)",
+        "ANALYZE",
+    ]),
+    (3, "Totales mensuales materializados por portafolio y moneda (ver summary.py)", [
+        # Suma de montos en la moneda original; la conversión a USD/MXN se hace
+        # al leer, así un cambio de tipo de cambio no obliga a recalcular nada.
+        """
+        CREATE TABLE IF NOT EXISTS portfolio_month_totals (
+            portfolio_id INTEGER NOT NULL,
+            month        TEXT    NOT NULL,
+            currency     TEXT    NOT NULL DEFAULT '',
+            amount       REAL    NOT NULL DEFAULT 0,
+            n_values     INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (portfolio_id, month, currency)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_totals_value_insert
+        AFTER INSERT ON asset_values
+        BEGIN
+            INSERT INTO portfolio_month_totals (portfolio_id, month, currency, amount, n_values)
+            SELECT a.portfolio_id, NEW.month, COALESCE(NEW.currency, ''), COALESCE(NEW.amount, 0), 1
+              FROM assets a
+             WHERE a.id = NEW.asset_id
+            ON CONFLICT(portfolio_id, month, currency) DO UPDATE SET
+                amount   = amount + excluded.amount,
+                n_values = n_values + 1;
+        END
+        """,
+        # Si el activo ya no existe (borrado en cascada) lo resta trg_totals_asset_delete
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_totals_value_delete
+        AFTER DELETE ON asset_values
+        BEGIN
+            UPDATE portfolio_month_totals
+               SET amount   = amount - COALESCE(OLD.amount, 0),
+                   n_values = n_values - 1
+             WHERE portfolio_id = (SELECT portfolio_id FROM assets WHERE id = OLD.asset_id)
+               AND month = OLD.month
+               AND currency = COALESCE(OLD.currency, '');
+            DELETE FROM portfolio_month_totals
+             WHERE n_values <= 0
+               AND portfolio_id = (SELECT portfolio_id FROM assets WHERE id = OLD.asset_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_totals_value_update
+        AFTER UPDATE OF asset_id, month, amount, currency ON asset_values
+        BEGIN
+            UPDATE portfolio_month_totals
+               SET amount   = amount - COALESCE(OLD.amount, 0),
+                   n_values = n_values - 1
+             WHERE portfolio_id = (SELECT portfolio_id FROM assets WHERE id = OLD.asset_id)
+               AND month = OLD.month
+               AND currency = COALESCE(OLD.currency, '');
+            INSERT INTO portfolio_month_totals (portfolio_id, month, currency, amount, n_values)
+            SELECT a.portfolio_id, NEW.month, COALESCE(NEW.currency, ''), COALESCE(NEW.amount, 0), 1
+              FROM assets a
+             WHERE a.id = NEW.asset_id
+            ON CONFLICT(portfolio_id, month, currency) DO UPDATE SET
+                amount   = amount + excluded.amount,
+                n_values = n_values + 1;
+            DELETE FROM portfolio_month_totals
+             WHERE n_values <= 0
+               AND portfolio_id = (SELECT portfolio_id FROM assets WHERE id = OLD.asset_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_totals_asset_delete
+        BEFORE DELETE ON assets
+        BEGIN
+            UPDATE portfolio_month_totals
+               SET amount   = portfolio_month_totals.amount - v.amount,
+                   n_values = portfolio_month_totals.n_values - v.n
+              FROM (SELECT month, COALESCE(currency, '') AS currency,
+                           SUM(COALESCE(amount, 0)) AS amount, COUNT(*) AS n
+                      FROM asset_values
+                     WHERE asset_id = OLD.id
+                     GROUP BY 1, 2) AS v
+             WHERE portfolio_month_totals.portfolio_id = OLD.portfolio_id
+               AND portfolio_month_totals.month = v.month
+               AND portfolio_month_totals.currency = v.currency;
+            DELETE FROM portfolio_month_totals
+             WHERE n_values <= 0
+               AND portfolio_id = OLD.portfolio_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_totals_asset_move
+        AFTER UPDATE OF portfolio_id ON assets
+        WHEN OLD.portfolio_id IS NOT NEW.portfolio_id
+        BEGIN
+            UPDATE portfolio_month_totals
+               SET amount   = portfolio_month_totals.amount - v.amount,
+                   n_values = portfolio_month_totals.n_values - v.n
+              FROM (SELECT month, COALESCE(currency, '') AS currency,
+                           SUM(COALESCE(amount, 0)) AS amount, COUNT(*) AS n
+                      FROM asset_values
+                     WHERE asset_id = NEW.id
+                     GROUP BY 1, 2) AS v
+             WHERE portfolio_month_totals.portfolio_id = OLD.portfolio_id
+               AND portfolio_month_totals.month = v.month
+               AND portfolio_month_totals.currency = v.currency;
+            DELETE FROM portfolio_month_totals
+             WHERE n_values <= 0
+               AND portfolio_id = OLD.portfolio_id;
+            INSERT INTO portfolio_month_totals (portfolio_id, month, currency, amount, n_values)
+            SELECT NEW.portfolio_id, month, COALESCE(currency, ''), SUM(COALESCE(amount, 0)), COUNT(*)
+              FROM asset_values
+             WHERE asset_id = NEW.id
+             GROUP BY 2, 3
+            ON CONFLICT(portfolio_id, month, currency) DO UPDATE SET
+                amount   = amount + excluded.amount,
+                n_values = n_values + excluded.n_values;
+        END
+        """,
+        "DELETE FROM portfolio_month_totals",
+        """
+        INSERT INTO portfolio_month_totals (portfolio_id, month, currency, amount, n_values)
+        SELECT a.portfolio_id, av.month, COALESCE(av.currency, ''), SUM(COALESCE(av.amount, 0)), COUNT(*)
+          FROM asset_values av
+          JOIN assets a ON a.id = av.asset_id
+         GROUP BY 1, 2, 3
+        """,
+    ]),
+    (4, "Versiones de datos para invalidar la caché de respuestas (ver cache.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope   TEXT    PRIMARY KEY,   -- 'global' o 'portfolio:<id>'
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (5, "Adjuntos por contenido (sha256) con contador de referencias (ver blobstore.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256     TEXT    PRIMARY KEY,
+            size       INTEGER NOT NULL,
+            mimetype   TEXT,
+            refcount   INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT    DEFAULT (datetime('now'))
+        ) WITHOUT ROWID
+        """,
+        # Los adjuntos anteriores conservan su path en static/uploads (sha256 nulo)
+        "ALTER TABLE attachments ADD COLUMN sha256 TEXT REFERENCES blobs(sha256)",
+        "CREATE INDEX IF NOT EXISTS idx_attachments_sha256 ON attachments(sha256)",
+        """
+        CREATE TRIGGER IF NOT EXISTS attachments_blob_ref AFTER INSERT ON attachments
+        WHEN NEW.sha256 IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = NEW.sha256;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS attachments_blob_unref AFTER DELETE ON attachments
+        WHEN OLD.sha256 IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = OLD.sha256;
+        END
+        """,
+    ]),
+]
+
+
+def current_version(conn):
+    """Última versión aplicada (0 si la base nunca se migró)."""
+    _ensure_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, target=None):
+    """
+    Aplica en orden las migraciones pendientes hasta `target` (por defecto la
+    última). Devuelve la lista de versiones aplicadas.
+    """
+    applied = []
+    version = current_version(conn)
+    for number, description, steps in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        conn.execute("BEGIN")
+        try:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                (number, description, datetime.now().isoformat(timespec='seconds'))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(number)
+    return applied
+
+
+_checked_paths = set()
+
+
+def ensure_current(conn, path):
+    """Migra la base `path` una sola vez por proceso (para usar en cada petición)."""
+    if path not in _checked_paths:
+        migrate(conn)
+        _checked_paths.add(path)
+
+
+def _ensure_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     INTEGER PRIMARY KEY,
+            description TEXT    NOT NULL,
+            applied_at  TEXT    NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+if __name__ == '__main__':
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    done = migrate(conn)
+    print(f"Migraciones aplicadas: {done or 'ninguna'}; versión actual: {current_version(conn)}")
+    conn.close()
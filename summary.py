@@ -0,0 +1,66 @@
+# ======================================================
+# TOTALES MENSUALES MATERIALIZADOS
+# ======================================================
+# La tabla portfolio_month_totals guarda, por portafolio, mes y moneda, la suma
+# de asset_values.amount y cuántos valores la componen. Se mantiene al día de
+# forma incremental con triggers sobre asset_values y assets (migración 3), así
+# cualquier escritura (rutas, copias masivas, importador) la actualiza.
+#
+# Los montos se guardan en su moneda original: la conversión a USD/MXN se
+# aplica al leer con el tipo de cambio de cada mes, que es exacta porque la
+# conversión es lineal. Así un cambio en exchange_rate no requiere recálculo.
+#
+# Reconstrucción completa (p.ej. tras cargar datos con los triggers apagados):
+#   python summary.py
+import pandas as pd
+
+import fx
+import metrics
+from database import get_db_connection
+
+
+def monthly_totals(conn, portfolio_id, rates=None):
+    """
+    Totales por mes del portafolio en USD y MXN (DataFrame indexado por mes con
+    columnas usd_value y mxn_value). Lee una fila por mes y moneda.
+    """
+    if rates is None:
+        rates = fx.rate_cache.snapshot()
+    df = pd.read_sql_query("""
+        SELECT month, currency, amount
+          FROM portfolio_month_totals
+         WHERE portfolio_id = ?
+         ORDER BY month
+    """, conn, params=(portfolio_id,))
+    with metrics.timer('pandas'):
+        df = fx.add_normalized_columns(df, rates)
+        return df.groupby('month')[['usd_value', 'mxn_value']].sum()
+
+
+def rebuild(conn=None):
+    """Recalcula la tabla completa desde asset_values. Devuelve el número de filas."""
+    own = conn is None
+    if own:
+        conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM portfolio_month_totals")
+        cursor = conn.execute("""
+            INSERT INTO portfolio_month_totals (portfolio_id, month, currency, amount, n_values)
+            SELECT a.portfolio_id, av.month, COALESCE(av.currency, ''), SUM(COALESCE(av.amount, 0)), COUNT(*)
+              FROM asset_values av
+              JOIN assets a ON a.id = av.asset_id
+             GROUP BY 1, 2, 3
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own:
+            conn.close()
+    return cursor.rowcount
+
+
+if __name__ == '__main__':
+    print(f"portfolio_month_totals reconstruida: {rebuild()} filas.")